@@ -0,0 +1,347 @@
+"""
+Stage by stage benchmark of the valuation pipeline on recorded fixtures.
+
+    python bench/bench_pipeline.py                      # 1, 100 and 5,000 tickers
+    python bench/bench_pipeline.py --sizes 1 100 --save-baseline
+    python bench/bench_pipeline.py --compare bench/baseline.json
+
+No network or API keys are needed. HTTP requests are answered from the JSON
+fixtures in bench/fixtures (see record.py) by a transport adapter mounted on
+hg_fmplib's shared session, so the real fetch and parse code runs. The
+reference spreadsheets are read from the repository's data/ directory. A
+universe of N tickers is made by cycling through the recorded tickers under
+synthetic symbols, each assigned an industry from RD_Amortization.xlsx so
+the reference lookups see a realistic spread of industries. The symbols'
+industries are written to a small indname.xlsx in a temporary directory,
+so hg_fmplib.get_industry loads and searches a real (pickled) index.
+
+Stages, each timed separately over the whole universe:
+
+    fetch_statements  hg_fmplib.get_statements (response cache disabled)
+    fetch_quotes      hg_fmplib.get_quotes
+    fetch_market      hg_fmplib.get_erp and get_risk_free
+    reference         industry group, beta, R&D life and default spread
+                      lookups, including loading the industry index
+    capitalize_rd     fmp_fcff.capitalizerAndD
+    calc_chain        fmp_fcff.value_company on the fetched inputs
+    insert_valuation  fmp_fcff.insert_valuation, one commit per row
+    store_batched     hg_store.ValuationStore
+
+Results are seconds per stage. --save-baseline writes them to a JSON file and
+--compare reports each stage against one, exiting non-zero when a stage is
+slower than the baseline by more than --tolerance.
+
+"""
+
+from itertools import cycle
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+os.environ.setdefault("FMP_DATA_DIR", str(ROOT / "data"))
+
+import requests  # noqa: E402
+
+import fmp_fcff  # noqa: E402
+import hg_cache  # noqa: E402
+import hg_fmplib  # noqa: E402
+import hg_store  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_SIZES = (1, 100, 5000)
+GROWTH_PERIOD = 5
+STAGES = (
+    "fetch_statements",
+    "fetch_quotes",
+    "fetch_market",
+    "reference",
+    "capitalize_rd",
+    "calc_chain",
+    "insert_valuation",
+    "store_batched",
+)
+
+
+class Fixtures:
+    """Recorded responses and the synthetic universe built from them."""
+
+    def __init__(self, path=FIXTURES):
+        self.tickers = {}
+        for fixture in sorted(path.glob("*.json")):
+            with open(fixture) as f:
+                data = json.load(f)
+            if fixture.stem == "market":
+                self.market = data
+            else:
+                self.tickers[data["ticker"]] = data
+        self.template = {}
+        self.industry = {}
+
+    def universe(self, size, industries):
+        """Make size synthetic symbols, each backed by a recorded ticker."""
+        symbols = []
+        templates = cycle(sorted(self.tickers))
+        industries = cycle(industries)
+        for i in range(size):
+            symbol = f"B{i:05d}"
+            self.template[symbol] = next(templates)
+            self.industry[symbol] = next(industries)
+            symbols.append(symbol)
+        return symbols
+
+    def records(self, endpoint, symbol):
+        """The recorded payload of a template ticker, relabelled as symbol."""
+        rows = self.tickers[self.template[symbol]][endpoint]
+        return [{**row, "symbol": symbol} for row in rows]
+
+    def respond(self, url, params):
+        if url.startswith(hg_fmplib.ERP_URL):
+            return self.market["erp_html"], "text/html"
+        if url.startswith(hg_fmplib.FRED_URL):
+            return json.dumps(self.market["fred"]), "application/json"
+
+        endpoint = url[len(hg_fmplib.FMP_BASE_URL) + 1 :]
+        if endpoint == "batch-quote":
+            rows = []
+            for symbol in params["symbols"].split(","):
+                profile = self.records("profile", symbol)[0]
+                rows.append({**profile, "name": profile["companyName"]})
+        else:
+            rows = self.records(endpoint, params["symbol"])
+        return json.dumps(rows), "application/json"
+
+
+class FixtureAdapter(requests.adapters.BaseAdapter):
+    """Transport adapter answering every request from the fixtures."""
+
+    def __init__(self, fixtures):
+        super().__init__()
+        self.fixtures = fixtures
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        url = f"{parts.scheme}://{parts.netloc}{parts.path}"
+        body, content_type = self.fixtures.respond(url, dict(parse_qsl(parts.query)))
+        response = requests.Response()
+        response.status_code = 200
+        response._content = body.encode()
+        response.headers["Content-Type"] = content_type
+        response.encoding = "utf-8"
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class BenchContext(fmp_fcff.ValuationContext):
+    """ValuationContext with fixed keys.
+
+    Industry groups come from the sheet install_industries writes.
+    """
+
+    def __init__(self, fixtures, eq_prem, risk_free):
+        super().__init__(eq_prem, risk_free)
+        self._values["api_key"] = "bench"
+        self._values["fred_key"] = "bench"
+        self.fixtures = fixtures
+
+
+def install(fixtures):
+    adapter = FixtureAdapter(fixtures)
+    session = hg_fmplib.get_session()
+    for prefix in (hg_fmplib.FMP_BASE_URL, hg_fmplib.FRED_URL, hg_fmplib.ERP_URL):
+        session.mount(prefix, adapter)
+
+
+def install_industries(fixtures, workdir):
+    """Point hg_fmplib's industry index at an indname.xlsx of the universe.
+
+    The sheet has the "Global by Industry" columns get_industry reads, one
+    row per symbol made so far. Its index is compiled and pickled here, so
+    the timed lookups start from the pickle as a scheduled run does.
+    """
+    import pandas as pd
+
+    hg_fmplib.INDUSTRY_XLSX = str(workdir / "indname.xlsx")
+    hg_fmplib.INDUSTRY_INDEX = str(workdir / "indname.idx.pickle")
+    pd.DataFrame(
+        {
+            "Exchange:Ticker": [f"Bench:{symbol}" for symbol in fixtures.industry],
+            "Industry Group": list(fixtures.industry.values()),
+        }
+    ).to_excel(hg_fmplib.INDUSTRY_XLSX, sheet_name="Global by Industry", index=False)
+    hg_fmplib.load_industry_index()
+
+
+def amortization_industries():
+    import pandas as pd
+
+    years = pd.read_excel(hg_fmplib.RD_AMORTIZATION_XLSX, sheet_name="Amort Years")
+    return years["Industry"].dropna().tolist()
+
+
+def run_size(fixtures, symbols, workdir):
+    """Time every stage over symbols; returns stage -> seconds."""
+    timings = {}
+
+    def timed(stage, fn):
+        start = time.perf_counter()
+        result = fn()
+        timings[stage] = time.perf_counter() - start
+        return result
+
+    statements = timed(
+        "fetch_statements",
+        lambda: {s: hg_fmplib.get_statements(s, "bench") for s in symbols},
+    )
+    quotes = timed(
+        "fetch_quotes", lambda: hg_fmplib.get_quotes(symbols, "bench", workers=1)
+    )
+    eq_prem, risk_free = timed(
+        "fetch_market",
+        lambda: (hg_fmplib.get_erp(), hg_fmplib.get_risk_free("bench")),
+    )
+
+    ctx = BenchContext(fixtures, eq_prem, risk_free)
+    # Every size loads the pickled index again
+    hg_fmplib._industry_index = None
+
+    def reference():
+        for symbol in symbols:
+            industry = ctx.industry(symbol)
+            ctx.beta(industry)
+            ctx.rd_years(industry)
+            inc_stmnt = statements[symbol].inc_stmnt()
+            hg_fmplib.get_default_spread(fmp_fcff.calc_interest_coverage(inc_stmnt))
+
+    timed("reference", reference)
+
+    def capitalize_rd():
+        for symbol in symbols:
+            rd_years = ctx.rd_years(ctx.industry(symbol))
+            fmp_fcff.capitalizerAndD(statements[symbol].rAndD(rd_years), rd_years)
+
+    timed("capitalize_rd", capitalize_rd)
+
+    valuations = timed(
+        "calc_chain",
+        lambda: [
+            fmp_fcff.value_company(s, GROWTH_PERIOD, statements[s], quotes[s], ctx)
+            for s in symbols
+        ],
+    )
+
+    def insert_valuation():
+        with sqlite3.connect(workdir / f"insert_{len(symbols)}.db") as conn:
+            hg_store.create_schema(conn)
+            for valuation in valuations:
+                fmp_fcff.insert_valuation(conn, valuation)
+
+    timed("insert_valuation", insert_valuation)
+
+    def store_batched():
+        with hg_store.ValuationStore(workdir / f"store_{len(symbols)}.db") as store:
+            store.add_many(valuations)
+
+    timed("store_batched", store_batched)
+    return timings
+
+
+def report(results, baseline=None, tolerance=0.25):
+    """Print the timings table; returns the (size, stage) pairs that regressed."""
+    regressions = []
+    for size, timings in results.items():
+        print(f"\n{size} tickers")
+        for stage in STAGES:
+            seconds = timings[stage]
+            line = (
+                f"  {stage:<18}{seconds:>10.4f} s{seconds / int(size) * 1e6:>12.1f} us"
+            )
+            base = (baseline or {}).get(size, {}).get(stage)
+            if base:
+                ratio = seconds / base
+                line += f"{ratio:>8.2f}x"
+                if ratio > 1 + tolerance:
+                    line += "  REGRESSION"
+                    regressions.append((size, stage))
+            print(line)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the valuation pipeline stages on recorded fixtures"
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="universe sizes"
+    )
+    parser.add_argument(
+        "--save-baseline",
+        nargs="?",
+        const=BASELINE,
+        type=Path,
+        metavar="PATH",
+        help=f"write the timings as the baseline (default {BASELINE.name})",
+    )
+    parser.add_argument(
+        "--compare", type=Path, metavar="PATH", help="baseline to compare against"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.25,
+        help="slowdown over the baseline reported as a regression (default 0.25)",
+    )
+    args = parser.parse_args(argv)
+
+    hg_cache.CACHE.enabled = False
+    fixtures = Fixtures()
+    install(fixtures)
+    industries = amortization_industries()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as workdir:
+        # Smaller universes are prefixes of the largest one
+        fixtures.universe(max(args.sizes), industries)
+        install_industries(fixtures, Path(workdir))
+        for size in args.sizes:
+            symbols = fixtures.universe(size, industries)
+            results[str(size)] = run_size(fixtures, symbols, Path(workdir))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+    regressions = report(results, baseline, args.tolerance)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "machine": platform.machine(),
+                    "fixtures": sorted(fixtures.tickers),
+                    "results": results,
+                },
+                f,
+                indent=1,
+            )
+        print(f"\nbaseline written to {args.save_baseline}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+End-to-end load test against the stand-in server.
+
+    python bench/load_test.py                          # 100, 1,000 and 10,000 tickers
+    python bench/load_test.py --sizes 1000 --latency 0.05 --rate-limit 3000
+    python bench/load_test.py --url http://loadhost:8765 --mode universe
+
+Starts stub_server on a local thread (unless --url names a running one),
+points hg_fmplib's FMP, FRED and ERP URLs at it, turns the response cache
+off and values N synthetic tickers into a temporary database, with
+fmp_pipeline by default or fmp_fcff.value_universe with --mode universe.
+Each size starts by fetching the ERP and risk free rate from the server.
+The report has seconds and tickers/s per size, the valuations written and
+failed, and the server's counts of requests, 429s and injected errors.
+
+A local server shares the GIL with the run it serves, so for numbers that
+leave it out, start stub_server.py in another process and pass --url.
+
+"""
+
+from pathlib import Path
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+os.environ.setdefault("FMP_DATA_DIR", str(ROOT / "data"))
+
+import fmp_fcff  # noqa: E402
+import fmp_pipeline  # noqa: E402
+import hg_cache  # noqa: E402
+import hg_fmplib  # noqa: E402
+import stub_server  # noqa: E402
+from bench_pipeline import amortization_industries  # noqa: E402
+
+DEFAULT_SIZES = (100, 1000, 10000)
+GROWTH_PERIOD = 5
+COLUMNS = (
+    "tickers",
+    "seconds",
+    "tickers_per_s",
+    "written",
+    "failed",
+    "requests",
+    "rate_limited",
+    "errors",
+)
+
+
+class LoadContext(fmp_fcff.ValuationContext):
+    """ValuationContext with fixed keys and industries assigned round robin."""
+
+    def __init__(self, industries, eq_prem, risk_free):
+        super().__init__(eq_prem, risk_free)
+        self._values["api_key"] = "load"
+        self._values["fred_key"] = "load"
+        self.industries = industries
+
+    def industry(self, company):
+        return self.industries[int(company[1:]) % len(self.industries)]
+
+
+def point_at(url):
+    """Send hg_fmplib's FMP, FRED and ERP requests to the server at url."""
+    hg_fmplib.FMP_BASE_URL = f"{url}/stable"
+    hg_fmplib.FRED_BASE_URL = f"{url}/fred"
+    hg_fmplib.FRED_URL = f"{url}{stub_server.FRED_PATH}"
+    hg_fmplib.ERP_URL = f"{url}{stub_server.ERP_PATH}"
+
+
+def server_stats(url):
+    return hg_fmplib.http_get(f"{url}{stub_server.STATS_PATH}").json()
+
+
+def run_size(size, url, industries, workdir, args):
+    symbols = [f"L{i:05d}" for i in range(size)]
+    database = str(workdir / f"load_{size}.db")
+    before = server_stats(url)
+    start = time.perf_counter()
+
+    ctx = LoadContext(industries, hg_fmplib.get_erp(), hg_fmplib.get_risk_free("load"))
+    if args.mode == "pipeline":
+        summary = fmp_pipeline.ValuationPipeline(
+            GROWTH_PERIOD,
+            args.fetch_workers,
+            args.valuation_workers,
+            database=database,
+            ctx=ctx,
+            full=True,
+        ).run(symbols)
+        written = summary["counters"]["written"]
+    else:
+        fmp_fcff.VALUATION_DB = database
+        written = len(
+            fmp_fcff.value_universe(
+                symbols, GROWTH_PERIOD, args.workers, ctx=ctx, full=True
+            )
+        )
+
+    seconds = time.perf_counter() - start
+    after = server_stats(url)
+    return {
+        "tickers": size,
+        "seconds": seconds,
+        "tickers_per_s": size / seconds,
+        "written": written,
+        "failed": size - written,
+        **{name: after[name] - before[name] for name in after},
+    }
+
+
+def print_report(results):
+    print("  ".join(f"{c:>13}" for c in COLUMNS))
+    for result in results:
+        print(
+            "  ".join(
+                f"{result[c]:>13.2f}"
+                if isinstance(result[c], float)
+                else f"{result[c]:>13}"
+                for c in COLUMNS
+            )
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Load test the valuation run against a stand-in FMP server"
+    )
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="universe sizes"
+    )
+    parser.add_argument("--url", help="running stub_server (default: start one)")
+    parser.add_argument(
+        "--mode",
+        choices=("pipeline", "universe"),
+        default="pipeline",
+        help="fmp_pipeline or fmp_fcff.value_universe",
+    )
+    parser.add_argument(
+        "--fetch-workers", type=int, default=fmp_pipeline.DEFAULT_FETCH_WORKERS
+    )
+    parser.add_argument("--valuation-workers", type=int)
+    parser.add_argument(
+        "--workers", type=int, default=fmp_fcff.DEFAULT_WORKERS, help="universe mode"
+    )
+    server_options = parser.add_argument_group("local server faults")
+    server_options.add_argument("--latency", type=float, default=0.0)
+    server_options.add_argument("--jitter", type=float, default=0.0)
+    server_options.add_argument("--error-rate", type=float, default=0.0)
+    server_options.add_argument("--rate-limit", type=float, metavar="N")
+    server_options.add_argument("--burst", type=float)
+    parser.add_argument("--json", type=Path, help="write the results here")
+    args = parser.parse_args(argv)
+
+    hg_cache.CACHE.enabled = False
+    server = None
+    url = args.url
+    if url is None:
+        server = stub_server.serve_in_thread(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            rate_limit=args.rate_limit,
+            burst=args.burst,
+        )
+        url = server.url
+    point_at(url)
+    industries = amortization_industries()
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in args.sizes:
+            results.append(run_size(size, url, industries, Path(workdir), args))
+    if server is not None:
+        server.shutdown()
+
+    print_report(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"mode": args.mode, "url": url, "results": results}, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Record live FMP, FRED and Damodaran responses as benchmark fixtures.
+
+    python bench/record.py AAPL MSFT F
+
+Writes bench/fixtures/<TICKER>.json with the raw payload of every endpoint a
+valuation reads plus the ticker's industry group, and bench/fixtures/market.json
+with the GS10 observation and the ERP page. The response cache is bypassed so
+the fixtures are exactly what the API returns today. Needs the API keys and
+indname.xlsx in hg_fmplib.DATA_DIR.
+
+"""
+
+from pathlib import Path
+import argparse
+import json
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+
+import fmp_fcff  # noqa: E402
+import hg_cache  # noqa: E402
+import hg_fmplib  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+
+# Endpoint -> extra query parameters, as requested by hg_fmplib
+ENDPOINTS = {
+    "income-statement": {"period": "quarter", "limit": 20},
+    "balance-sheet-statement": {"period": "quarter", "limit": 20},
+    "cash-flow-statement": {"period": "quarter", "limit": 20},
+    "profile": {},
+    "shares-float": {},
+}
+
+
+def record_ticker(ticker, api_key, fixtures=FIXTURES):
+    fixture = {"ticker": ticker, "industry": hg_fmplib.get_industry(ticker)}
+    for endpoint, params in ENDPOINTS.items():
+        fixture[endpoint] = hg_fmplib.fetch_fmp(endpoint, ticker, api_key, **params)
+    with open(fixtures / f"{ticker}.json", "w") as f:
+        json.dump(fixture, f, indent=1)
+
+
+def record_market(fred_key, fixtures=FIXTURES):
+    fred = hg_fmplib.http_get(
+        hg_fmplib.FRED_URL,
+        params={
+            "series_id": "GS10",
+            "api_key": fred_key,
+            "file_type": "json",
+            "sort_order": "desc",
+            "limit": 1,
+        },
+    ).json()
+    market = {"fred": fred, "erp_html": hg_fmplib.http_get(hg_fmplib.ERP_URL).text}
+    with open(fixtures / "market.json", "w") as f:
+        json.dump(market, f, indent=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record benchmark fixtures")
+    parser.add_argument("tickers", nargs="+", help="tickers to record")
+    parser.add_argument("-o", "--output", type=Path, default=FIXTURES)
+    args = parser.parse_args(argv)
+
+    hg_cache.CACHE.enabled = False
+    args.output.mkdir(parents=True, exist_ok=True)
+    ctx = fmp_fcff.ValuationContext()
+    record_market(ctx.fred_key, args.output)
+    for ticker in args.tickers:
+        record_ticker(ticker.upper(), ctx.api_key, args.output)
+        print(f"recorded {ticker.upper()}")
+
+
+if __name__ == "__main__":
+    main()
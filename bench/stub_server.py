@@ -0,0 +1,291 @@
+"""
+Local stand-in for the FMP, FRED and ERP endpoints, for load testing.
+
+    python bench/stub_server.py --port 8765 --latency 0.05 --jitter 0.05
+    python bench/stub_server.py --error-rate 0.01 --rate-limit 3000
+
+    FMP_BASE_URL=http://127.0.0.1:8765/stable \\
+    FRED_BASE_URL=http://127.0.0.1:8765/fred \\
+    ERP_URL=http://127.0.0.1:8765/erp python src/fmp_pipeline.py ...
+
+Serves the stable/ statement, profile, shares-float and batch-quote
+endpoints, FRED series/observations and the ERP page from the fixtures in
+bench/fixtures (recorded with record.py, or the synthetic sample). Recorded
+tickers get their own payloads; any other symbol is answered with a
+recorded ticker's payloads relabelled, chosen by a hash of the symbol, so a
+universe of any size can be requested.
+
+Faults can be injected per request: a fixed latency plus uniform jitter, a
+fraction of 500 responses, and an FMP style rate limit of N requests a
+minute (token bucket of --burst requests) beyond which requests get 429
+with a Retry-After header. Endpoints named in unavailable answer 403, as
+FMP does for one the plan doesn't include, and symbols named in missing are
+left out of batch-quote answers. GET /__stats returns the request counters as
+JSON. Only the standard library is used, so the server can run on another
+host.
+
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qsl, urlsplit
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+DEFAULT_PORT = 8765
+
+FMP_PREFIX = "/stable/"
+FRED_PATH = "/fred/series/observations"
+ERP_PATH = "/erp"
+STATS_PATH = "/__stats"
+PER_SYMBOL_ENDPOINTS = (
+    "income-statement",
+    "balance-sheet-statement",
+    "cash-flow-statement",
+    "profile",
+    "shares-float",
+)
+
+
+class StubData:
+    """Fixture payloads, served for any symbol."""
+
+    def __init__(self, path=FIXTURES):
+        self.tickers = {}
+        for fixture in sorted(path.glob("*.json")):
+            with open(fixture) as f:
+                data = json.load(f)
+            if fixture.stem == "market":
+                self.market = data
+            else:
+                self.tickers[data["ticker"]] = data
+        self._templates = sorted(self.tickers)
+
+    def template(self, symbol):
+        if symbol in self.tickers:
+            return self.tickers[symbol]
+        index = zlib.crc32(symbol.encode()) % len(self._templates)
+        return self.tickers[self._templates[index]]
+
+    def records(self, endpoint, symbol, limit=None):
+        rows = self.template(symbol)[endpoint]
+        if limit is not None:
+            rows = rows[:limit]
+        return [{**row, "symbol": symbol} for row in rows]
+
+    def batch_quote(self, symbols, missing=()):
+        rows = []
+        for symbol in symbols:
+            if symbol in missing:
+                continue
+            profile = self.records("profile", symbol)[0]
+            rows.append({**profile, "name": profile["companyName"]})
+        return rows
+
+
+class TokenBucket:
+    """rate requests a minute, up to burst at once."""
+
+    def __init__(self, rate, burst=None):
+        self.per_second = rate / 60
+        self.capacity = burst or max(1.0, self.per_second)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self):
+        """Take a token; returns 0 or the seconds until one is available."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.per_second
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.per_second
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+    def __init__(
+        self,
+        address,
+        data=None,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        rate_limit=None,
+        burst=None,
+        seed=None,
+        unavailable=(),
+        missing=(),
+    ):
+        super().__init__(address, StubHandler)
+        self.data = data or StubData()
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bucket = TokenBucket(rate_limit, burst) if rate_limit else None
+        self.random = random.Random(seed)
+        self.unavailable = set(unavailable)
+        self.missing = set(missing)
+        self._lock = threading.Lock()
+        self.stats = dict.fromkeys(("requests", "ok", "rate_limited", "errors"), 0)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def stats_snapshot(self):
+        with self._lock:
+            return dict(self.stats)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        parts = urlsplit(self.path)
+        params = dict(parse_qsl(parts.query))
+        if parts.path == STATS_PATH:
+            return self.send(200, server.stats_snapshot())
+
+        server.count("requests")
+        if server.bucket is not None:
+            wait = server.bucket.take()
+            if wait:
+                server.count("rate_limited")
+                return self.send(
+                    429,
+                    {"Error Message": "Limit Reach"},
+                    {"Retry-After": str(max(1, round(wait)))},
+                )
+        delay = server.latency + server.random.uniform(0, server.jitter)
+        if delay:
+            time.sleep(delay)
+        if server.error_rate and server.random.random() < server.error_rate:
+            server.count("errors")
+            return self.send(500, {"Error Message": "Injected error"})
+
+        try:
+            body = self.respond(parts.path, params)
+        except PermissionError as e:
+            return self.send(403, {"Error Message": str(e)})
+        except (KeyError, IndexError, ValueError) as e:
+            return self.send(400, {"Error Message": f"Bad request: {e}"})
+        if body is None:
+            return self.send(404, {"Error Message": "Unknown endpoint"})
+        server.count("ok")
+        if isinstance(body, str):
+            return self.send(200, body, content_type="text/html")
+        return self.send(200, body)
+
+    def respond(self, path, params):
+        data = self.server.data
+        if path == FRED_PATH:
+            return data.market["fred"]
+        if path == ERP_PATH:
+            return data.market["erp_html"]
+        if not path.startswith(FMP_PREFIX):
+            return None
+        endpoint = path[len(FMP_PREFIX) :]
+        if endpoint in self.server.unavailable:
+            raise PermissionError(f"{endpoint} is not available on this plan")
+        if endpoint == "batch-quote":
+            return data.batch_quote(params["symbols"].split(","), self.server.missing)
+        if endpoint in PER_SYMBOL_ENDPOINTS:
+            limit = int(params["limit"]) if "limit" in params else None
+            return data.records(endpoint, params["symbol"], limit)
+        return None
+
+    def send(self, status, body, headers=None, content_type="application/json"):
+        payload = (body if isinstance(body, str) else json.dumps(body)).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_in_thread(host="127.0.0.1", port=0, **options):
+    """Start a StubServer on a daemon thread; port 0 picks a free port."""
+    server = StubServer((host, port), **options)
+    threading.Thread(
+        target=server.serve_forever, name="stub-server", daemon=True
+    ).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Serve FMP, FRED and ERP responses from fixtures"
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="seconds added to every response"
+    )
+    parser.add_argument(
+        "--jitter", type=float, default=0.0, help="up to this many more seconds"
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="fraction answered with 500"
+    )
+    parser.add_argument(
+        "--rate-limit", type=float, metavar="N", help="requests a minute before 429s"
+    )
+    parser.add_argument("--burst", type=float, help="requests allowed at once")
+    parser.add_argument("--seed", type=int, help="seed for jitter and errors")
+    parser.add_argument(
+        "--unavailable", nargs="+", default=(), help="endpoints answered with 403"
+    )
+    parser.add_argument(
+        "--missing", nargs="+", default=(), help="symbols left out of batch-quote"
+    )
+    parser.add_argument("--fixtures", type=Path, default=FIXTURES)
+    args = parser.parse_args(argv)
+
+    server = StubServer(
+        (args.host, args.port),
+        StubData(args.fixtures),
+        args.latency,
+        args.jitter,
+        args.error_rate,
+        args.rate_limit,
+        args.burst,
+        args.seed,
+        args.unavailable,
+        args.missing,
+    )
+    print(f"Serving on {server.url} (FMP {server.url}/stable, FRED {server.url}/fred)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats_snapshot()))
+
+
+if __name__ == "__main__":
+    main()
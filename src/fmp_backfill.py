@@ -0,0 +1,250 @@
+"""
+Point-in-time backfill of the valuation table.
+
+Recomputes valuations as of past dates (every quarter end between two dates)
+for a list of tickers, for backtesting margin of safety signals. Each ticker's
+statement history and price history are fetched once (and cached) and then
+sliced to what had been filed by each date. Only (ticker, valuation_date)
+pairs missing from the database are computed, so extending the backfill each
+night only does the new quarter. Dates a ticker can't be valued on because
+of what it filed (too few quarters, no share count, a model error) are
+recorded in backfill_skipped and not tried again unless asked to. Dates
+missing a price or risk free rate are left unrecorded, since an empty
+response may only be a bad fetch, and are tried again on the next run.
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+import argparse
+import fmp_fcff
+import hg_cache
+import hg_fmplib
+import hg_logging
+import hg_store
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+# Quarters of history to fetch: 10 years of dates plus 5 years of lookback
+HISTORY_QUARTERS = 60
+# The model needs two year-end balance sheets and a full year of flows
+MIN_QUARTERS = 8
+DEFAULT_YEARS = 10
+
+
+def quarter_ends(start, end):
+    """ISO dates of every calendar quarter end from start to end inclusive."""
+    start, end = date.fromisoformat(start), date.fromisoformat(end)
+    ends = []
+    for year in range(start.year, end.year + 1):
+        for month, day in ((3, 31), (6, 30), (9, 30), (12, 31)):
+            quarter_end = date(year, month, day)
+            if start <= quarter_end <= end:
+                ends.append(str(quarter_end))
+    return ends
+
+
+def years_before(day, years):
+    """The same calendar day years earlier; Feb 29 becomes Feb 28."""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+
+def risk_free_as_of(rf_history, valuation_date):
+    """The GS10 rate known on valuation_date, as (date, rate), or None.
+
+    GS10 observations are monthly averages dated the 1st and published the
+    following month, so the latest one known on a date is the previous
+    month's.
+    """
+    month_start = date.fromisoformat(valuation_date).replace(day=1)
+    return hg_fmplib.price_as_of(rf_history, str(month_start - timedelta(days=1)))
+
+
+def backfill_company(company, dates, growth_period, ctx, rf_history, eq_prem):
+    """Value one ticker as of each date in dates.
+
+    The statements are sliced to the quarters filed by each date. Price is the
+    last close on or before the date and shares outstanding are the diluted
+    weighted average of the latest filed quarter. The risk free rate is the
+    GS10 observation known on the date (risk_free_as_of). Returns the
+    Stock_Values and the (ticker, date, reason) rows of the dates skipped for
+    good; dates without a price or risk free rate are only logged.
+    """
+    api_key = ctx.api_key
+    ctx.industry_params(ctx.industry(company))
+
+    statements = hg_fmplib.get_statements(company, api_key, HISTORY_QUARTERS)
+    first = str(date.fromisoformat(dates[0]) - timedelta(days=10))
+    prices = hg_fmplib.get_price_history(company, api_key, first, dates[-1])
+    ent_name = hg_fmplib.fetch_fmp("profile", company, api_key)[0]["companyName"]
+
+    valuations = []
+    skipped = []
+
+    def skip(valuation_date, reason):
+        logger.debug("%s %s: %s", company, valuation_date, reason)
+        skipped.append((company, valuation_date, reason))
+
+    for valuation_date in dates:
+        as_of = statements.as_of(valuation_date)
+        close = hg_fmplib.price_as_of(prices, valuation_date)
+        risk_free = risk_free_as_of(rf_history, valuation_date)
+        if len(as_of.income) < MIN_QUARTERS or len(as_of.balance) < 5:
+            skip(valuation_date, "not enough filed quarters")
+            continue
+        if close is None or risk_free is None:
+            # Not recorded: the history may come back on the next run
+            logger.debug("%s %s: no price or risk free rate", company, valuation_date)
+            continue
+
+        price = close[1]
+        shares = as_of.income.column("weightedAverageShsOutDil")[0]
+        if shares <= 0:
+            skip(valuation_date, "no share count")
+            continue
+        try:
+            valuations.append(
+                fmp_fcff.value_company(
+                    company,
+                    growth_period,
+                    as_of,
+                    (price, shares, price * shares, ent_name),
+                    ctx.at_market(eq_prem, risk_free[1]),
+                    valuation_date,
+                )
+            )
+        except (ArithmeticError, ValueError, IndexError) as e:
+            logger.warning("Backfill failed for %s %s: %s", company, valuation_date, e)
+            skipped.append((company, valuation_date, f"valuation failed: {e}"))
+    return fmp_fcff.with_implied_growth(valuations, growth_period), skipped
+
+
+def backfill_universe(
+    tickers,
+    start,
+    end,
+    growth_period,
+    workers=fmp_fcff.DEFAULT_WORKERS,
+    ctx=None,
+    eq_prem=None,
+    database=None,
+    retry_skipped=False,
+):
+    """Backfill quarter-end valuations for tickers between start and end.
+
+    Pairs already in the database, or recorded as skipped by an earlier run,
+    are left out, and a ticker with nothing missing is not fetched at all.
+    retry_skipped forgets the recorded skips of tickers first. ERP history
+    isn't published in a machine readable form, so every date uses eq_prem,
+    defaulting to today's ERP. Returns the number of rows written.
+    """
+    ctx = ctx or fmp_fcff.CONTEXT
+    dates = quarter_ends(start, end)
+
+    with hg_store.ValuationStore(database or fmp_fcff.VALUATION_DB) as store:
+        if retry_skipped:
+            hg_store.clear_skipped(store.conn, tickers)
+        done = hg_store.existing_keys(store.conn, tickers)
+        done |= hg_store.existing_keys(store.conn, tickers, "backfill_skipped")
+        todo = {}
+        for ticker in tickers:
+            missing = [d for d in dates if (ticker, d) not in done]
+            if missing:
+                todo[ticker] = missing
+        logger.info(
+            "Backfill %s..%s: %s of %s tickers have %s dates to compute",
+            start,
+            end,
+            len(todo),
+            len(tickers),
+            sum(len(d) for d in todo.values()),
+        )
+        if not todo:
+            return 0
+
+        hg_cache.CACHE.purge_expired()
+        # Each industry's parameters are resolved once, up front
+        groups, _ = fmp_fcff.group_by_industry(todo, ctx)
+        eq_prem = eq_prem if eq_prem is not None else ctx.eq_prem
+        rf_start = str(date.fromisoformat(dates[0]) - timedelta(days=366))
+        rf_history = hg_fmplib.get_risk_free_history(ctx.fred_key, rf_start)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(
+                    backfill_company,
+                    ticker,
+                    todo[ticker],
+                    growth_period,
+                    ctx,
+                    rf_history,
+                    eq_prem,
+                ): ticker
+                for members in groups.values()
+                for ticker in members
+            }
+            for future in as_completed(futures):
+                ticker = futures[future]
+                try:
+                    valuations, skipped = future.result()
+                    store.add_many(valuations)
+                    hg_store.record_skipped(store.conn, skipped)
+                except Exception as e:
+                    logger.warning("Backfill failed for %s: %s", ticker, e)
+        store.flush()
+        return store.written
+
+
+def main(argv=None):
+    today = date.today()
+    parser = argparse.ArgumentParser(
+        description="Backfill quarter-end valuations into the valuation table"
+    )
+    parser.add_argument("tickers", nargs="*", help="ticker symbols to backfill")
+    parser.add_argument("-f", "--file", help="text file with one ticker per line")
+    parser.add_argument(
+        "--start",
+        default=str(years_before(today, DEFAULT_YEARS)),
+        help=f"first date, ISO format (default {DEFAULT_YEARS} years ago)",
+    )
+    parser.add_argument("--end", default=str(today), help="last date (default today)")
+    parser.add_argument(
+        "-g", "--growth-period", type=int, default=5, help="growth period in years"
+    )
+    parser.add_argument("-w", "--workers", type=int, default=fmp_fcff.DEFAULT_WORKERS)
+    parser.add_argument(
+        "--erp", type=float, help="equity risk premium for every date (default today's)"
+    )
+    parser.add_argument(
+        "--retry-skipped",
+        action="store_true",
+        help="try again the dates earlier runs couldn't value",
+    )
+    args = parser.parse_args(argv)
+    hg_logging.setup_logging()
+
+    tickers = [t.upper() for t in args.tickers]
+    if args.file:
+        tickers += fmp_fcff.read_tickers(args.file)
+    if not tickers:
+        parser.error("no tickers given")
+
+    written = backfill_universe(
+        tickers,
+        args.start,
+        args.end,
+        args.growth_period,
+        args.workers,
+        eq_prem=args.erp,
+        retry_skipped=args.retry_skipped,
+    )
+    print(f"DONE: {written} valuations written")
+
+
+if __name__ == "__main__":
+    main()
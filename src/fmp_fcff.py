@@ -4,46 +4,203 @@ Price dances with hope and fear,
 Worth hides in the mist.
 """
 
-from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, replace
 from datetime import date
+import argparse
+import copy
+import csv
+import hashlib
 import sqlite3
+import threading
+import hg_async
+import hg_cache
+import hg_dcf
 import hg_fmplib
+import hg_logging
+import hg_profile
+import hg_store
 import logging
+import numpy as np
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)  # Set the overall logger level
 
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
-# Create a stream handler for the console
-stream_handler = logging.StreamHandler()
-stream_handler.setLevel(logging.WARNING)  # only show INFO and above on console
-stream_handler.setFormatter(formatter)
+# ## Define the constants used in the module
 
-# Create a FileHandler for the log file
-file_handler = logging.FileHandler("data/value.log")
-file_handler.setLevel(logging.DEBUG)  # log all messages to the file
-file_handler.setFormatter(formatter)
+MARGINAL_TAX_RATE = 0.26
+API_KEY_PATH = f"{hg_fmplib.DATA_DIR}/ApiKey.txt"
+FRED_KEY_PATH = f"{hg_fmplib.DATA_DIR}/fred_api.txt"
+VALUATION_DB = hg_store.VALUATION_DB
+DEFAULT_WORKERS = 8
 
-# Add the handlers to the logger
-logger.addHandler(stream_handler)
-logger.addHandler(file_handler)
 
+# ## Valuation context
 
-# ## Define the constants used in the module
+# Context keys at_market pins; every other key is reference data
+MARKET_KEYS = ("market", "eq_prem", "risk_free")
 
-EQ_PREM = hg_fmplib.get_erp()
-MARGINAL_TAX_RATE = 0.26
-COMPANY = input("Input company ticker: ").upper()
-GROWTH_PERIOD = int(input("Input growth period: "))
-INDUSTRY = hg_fmplib.get_industry(COMPANY)
-with open("/Users/jhess/Development/FMP/data/ApiKey.txt") as f:
-    MY_API_KEY = f.readline()
-with open("/Users/jhess/Development/FMP/data/fred_api.txt") as f:
-    FRED_KEY = f.readline()
-RD_YEARS = hg_fmplib.get_rAndD_years(INDUSTRY) + 1
-UNLEVERED_BETA = hg_fmplib.get_beta(INDUSTRY)
-RISK_FREE = hg_fmplib.get_risk_free(FRED_KEY)
+
+@dataclass(frozen=True)
+class IndustryParams:
+    """Reference parameters shared by every company in an industry."""
+
+    industry: str
+    unlevered_beta: float
+    stable_beta: float
+    rd_years: int
+
+
+class ValuationContext:
+    """Market parameters and reference data for a run, resolved on first use.
+
+    Nothing is read or fetched until an attribute is needed: the API keys come
+    from their files, ERP and risk free rate from the host's daily market
+    snapshot (hg_fmplib.get_market_snapshot), and industry, beta and R&D
+    years from the reference spreadsheets. Every value is memoized, so worker
+    threads sharing a context resolve each one once. ERP and risk free rate
+    can be pinned by passing them in.
+    """
+
+    def __init__(
+        self,
+        eq_prem=None,
+        risk_free=None,
+        api_key_path=API_KEY_PATH,
+        fred_key_path=FRED_KEY_PATH,
+    ):
+        self.api_key_path = api_key_path
+        self.fred_key_path = fred_key_path
+        self._values = {}
+        if eq_prem is not None:
+            self._values["eq_prem"] = eq_prem
+        if risk_free is not None:
+            self._values["risk_free"] = risk_free
+        self._lock = threading.RLock()
+        # Context at_market was called on, which resolves everything but the
+        # market parameters
+        self._parent = None
+
+    def _resolve(self, key, fetch, *args):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        if self._parent is not None and key not in MARKET_KEYS:
+            return self._parent._resolve(key, fetch, *args)
+        with self._lock:
+            if key not in self._values:
+                self._values[key] = fetch(*args)
+            return self._values[key]
+
+    @property
+    def api_key(self):
+        return self._resolve("api_key", read_key, self.api_key_path)
+
+    @property
+    def fred_key(self):
+        return self._resolve("fred_key", read_key, self.fred_key_path)
+
+    @property
+    def market(self):
+        return self._resolve(
+            "market", lambda: hg_fmplib.get_market_snapshot(self.fred_key)
+        )
+
+    @property
+    def eq_prem(self):
+        return self._resolve("eq_prem", lambda: self.market.eq_prem)
+
+    @property
+    def risk_free(self):
+        return self._resolve("risk_free", lambda: self.market.risk_free)
+
+    def at_market(self, eq_prem, risk_free):
+        """A context pinned to other market parameters, e.g. for a past date.
+
+        A shallow copy, so a subclass keeps its overrides. Reference data
+        (industry, beta, R&D years, keys) is resolved through this context
+        rather than copied, so creating one costs the same however much is
+        memoized here.
+        """
+        ctx = copy.copy(self)
+        ctx._values = {"eq_prem": eq_prem, "risk_free": risk_free}
+        ctx._lock = threading.RLock()
+        ctx._parent = self
+        return ctx
+
+    def industry(self, company):
+        return self._resolve(("industry", company), hg_fmplib.get_industry, company)
+
+    def industry_params(self, industry):
+        return self._resolve(
+            ("industry_params", industry), load_industry_params, industry
+        )
+
+    def preset_industry(self, company, params):
+        """Use industry parameters resolved elsewhere, e.g. in a parent process."""
+        with self._lock:
+            self._values[("industry", company)] = params.industry
+            self._values[("industry_params", params.industry)] = params
+
+    def beta(self, industry):
+        return self.industry_params(industry).unlevered_beta
+
+    def rd_years(self, industry):
+        return self.industry_params(industry).rd_years
+
+
+def load_industry_params(industry):
+    unlevered_beta = hg_fmplib.get_beta(industry)
+    return IndustryParams(
+        industry,
+        unlevered_beta,
+        calc_stable_beta(unlevered_beta),
+        # One more than the amortization years, to include the current year
+        hg_fmplib.get_rAndD_years(industry) + 1,
+    )
+
+
+def group_by_industry(tickers, ctx=None):
+    """Group tickers by industry, resolving each industry's parameters once.
+
+    Returns industry -> tickers in first seen order, plus the tickers whose
+    industry or reference parameters couldn't be found (logged).
+    """
+    ctx = ctx or CONTEXT
+    groups = {}
+    failed = []
+    for ticker in tickers:
+        try:
+            industry = ctx.industry(ticker)
+            ctx.industry_params(industry)
+        except ValueError as e:
+            logger.warning("No industry parameters for %s: %s", ticker, e)
+            failed.append(ticker)
+            continue
+        groups.setdefault(industry, []).append(ticker)
+    return groups, failed
+
+
+def read_key(path):
+    with open(path) as f:
+        return f.readline()
+
+
+CONTEXT = ValuationContext()
+
+
+def __getattr__(name):
+    # Module level names from before the context existed, now resolved lazily
+    lazy = {
+        "EQ_PREM": "eq_prem",
+        "RISK_FREE": "risk_free",
+        "MY_API_KEY": "api_key",
+        "FRED_KEY": "fred_key",
+    }
+    if name in lazy:
+        return getattr(CONTEXT, lazy[name])
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 # ## Class for Valuation
@@ -70,76 +227,27 @@ class Stock_Value:
     margin_of_safety: float
     margin_of_safety_pc: float
 
+    # fingerprint of the inputs, see input_fingerprint
+    input_hash: str | None = None
+    # growth rate that makes share_value equal price, see with_implied_growth
+    implied_growth_rate: float | None = None
+
 
 # ## Functions
 
 
 def create_table():
-    # conn = sqlite3.connect("/Volumes/Financial Data/valuation.db")
-    database = "/Volumes/Financial_Data/valuation.db"
-    statements = [
-        """CREATE TABLE IF NOT EXISTS valuation (
-              ticker TEXT NOT NULL,
-              valuation_date TEXT NOT NULL,
-              ent_name TEXT NOT NULL,
-              industry TEXT NOT NULL,
-              beta REAL NOT NULL,
-              market_cap REAL NOT NULL,
-              price REAL NOT NULL,
-              shares_outstanding REAL NOT NULL,
-              risk_free_rate REAL NOT NULL,
-              eq_premium REAL NOT NULL,
-              growth_rate REAL NOT NULL,
-              cost_of_capital REAL NOT NULL,
-              wealth_pc REAL NO NULL,
-              fcff_value REAL NOT NULL,
-              terminal_value REAL NOT NULL,
-              share_value REAL NOT NULL,
-              margin_of_safety REAL NOT NULL,
-              margin_of_safety_pc REAL NOT NULL,
-              PRIMARY KEY (ticker, valuation_date)
-              )
-              ;"""
-    ]
     try:
-        with sqlite3.connect(database) as conn:
-            cursor = conn.cursor()
-            for statement in statements:
-                cursor.execute(statement)
-            conn.commit()
+        with sqlite3.connect(VALUATION_DB) as conn:
+            hg_store.create_schema(conn)
             logger.info("Table created successfully")
     except sqlite3.OperationalError as e:
-        logger.warning(f"Failed to create tables: {e}")
+        logger.warning("Failed to create tables: %s", e)
 
 
+@hg_profile.timed
 def insert_valuation(conn, val):
-    c = conn.cursor()
-    c.execute(
-        """
-              INSERT OR REPLACE INTO valuation (ticker, valuation_date,ent_name, industry, beta, market_cap, price, shares_outstanding, risk_free_rate, eq_premium, growth_rate, cost_of_capital, wealth_pc, fcff_value, terminal_value, share_value, margin_of_safety, margin_of_safety_pc
-            )  VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-              """,
-        (
-            val.ticker,
-            val.valuation_date,
-            val.ent_name,
-            val.industry,
-            val.beta,
-            val.market_cap,
-            val.price,
-            val.shares_outstanding,
-            val.risk_free_rate,
-            val.eq_premium,
-            val.growth_rate,
-            val.cost_of_capital,
-            val.wealth_pc,
-            val.fcff_value,
-            val.terminal_value,
-            val.share_value,
-            val.margin_of_safety,
-            val.margin_of_safety_pc,
-        ),
-    )
+    conn.execute(hg_store.INSERT_VALUATION, hg_store.valuation_row(val))
     conn.commit()
 
 
@@ -175,6 +283,7 @@ def enterprise_quote(COMPANY, MY_API_KEY):
     return ent_quote
 
 
+@hg_profile.timed
 def calc_stable_beta(UNLEVERED_BETA):
     if UNLEVERED_BETA < 0.5:
         stable_beta = 0.8
@@ -183,23 +292,20 @@ def calc_stable_beta(UNLEVERED_BETA):
     else:
         stable_beta = 1.0
 
-    logger.info(f"Stable beta = {stable_beta:,.3f}")
+    logger.debug("Stable beta = %.3f", stable_beta)
 
     return stable_beta
 
 
+@hg_profile.timed
 def calc_capital_expenditures(cash_flw):
-    # normalize capex
-    capex = (
-        cash_flw["capex"][0]
-        + cash_flw["capex"][1]
-        + cash_flw["capex"][2]
-        + cash_flw["capex"][3]
-        + cash_flw["capex"][4]
-    ) / 5
+    # normalize capex over the years we have, at most five
+    years = cash_flw["capex"][:5]
+    capex = sum(years) / len(years)
     return capex
 
 
+@hg_profile.timed
 def calc_chng_wc(bal_sht):
     curr_yr_nc_wc = (
         bal_sht["total_current_assets"][0] - bal_sht["cash_and_equivalents"][0]
@@ -219,12 +325,12 @@ def calc_chng_wc(bal_sht):
     return chng_nc_wc
 
 
-def capitalizerAndD(COMPANY, RD_YEARS, MY_API_KEY):
-    rdTable = hg_fmplib.get_rAndD(COMPANY, RD_YEARS, MY_API_KEY)
+@hg_profile.timed
+def capitalizerAndD(rdTable, RD_YEARS):
     rd_dict, years_to_process = rdTable
-    logger.info(f"rdTable = {rdTable}")
-    logger.info(f"rd_dict = {rd_dict}")
-    logger.info(f"Years to Process = {years_to_process}")
+    logger.debug("rdTable = %s", rdTable)
+    logger.debug("rd_dict = %s", rd_dict)
+    logger.debug("Years to Process = %s", years_to_process)
     rd_table = {}
     rd_expense = []
     unamort_percent = []
@@ -259,21 +365,23 @@ def capitalizerAndD(COMPANY, RD_YEARS, MY_API_KEY):
     return rd_table
 
 
+@hg_profile.timed
 def calc_fcff(inc_stmnt, bal_sht, cash_flw, eff_tax_rate):
     ebiat = inc_stmnt["ebit"][0] * (1 - eff_tax_rate)
-    logger.info(f"ebiat {ebiat:,.2f}")
+    logger.debug("ebiat %.2f", ebiat)
     capex = calc_capital_expenditures(cash_flw)
-    logger.info(f"Capex {capex:,.2f}")
+    logger.debug("Capex %.2f", capex)
     chng_nc_wc = calc_chng_wc(bal_sht)
-    logger.info(f"Change WC {chng_nc_wc:,.2f}")
+    logger.debug("Change WC %.2f", chng_nc_wc)
     depreciation = cash_flw["depreciation"][0]
-    logger.info(f"Depreciation {depreciation:,.2f}")
+    logger.debug("Depreciation %.2f", depreciation)
     fcff = ebiat - capex + depreciation - chng_nc_wc
-    logger.info(f"FCFF {fcff:,.2f}")
+    logger.debug("FCFF %.2f", fcff)
     fcff_data = [ebiat, capex, chng_nc_wc, depreciation, fcff]
     return fcff_data
 
 
+@hg_profile.timed
 def calc_reinvestment(capex, depreciation, chng_nc_wc, amort_schedule):
     firm_reinvestment = (
         capex
@@ -282,10 +390,11 @@ def calc_reinvestment(capex, depreciation, chng_nc_wc, amort_schedule):
         + amort_schedule["rAndDExpense"][0]
         - amort_schedule["Current_Year_Amortization"]
     )
-    logger.info(f"Firm Reinvestment {firm_reinvestment:,.2f}")
+    logger.debug("Firm Reinvestment %.2f", firm_reinvestment)
     return firm_reinvestment
 
 
+@hg_profile.timed
 def calc_adj_ebiat(ebiat, amort_schedule):
     adjusted_ebiat = (
         ebiat
@@ -293,18 +402,20 @@ def calc_adj_ebiat(ebiat, amort_schedule):
         - amort_schedule["Current_Year_Amortization"]
     )
 
-    logger.info(f"Adjusted ebiat {adjusted_ebiat:,.2f}")
+    logger.debug("Adjusted ebiat %.2f", adjusted_ebiat)
     return adjusted_ebiat
 
 
+@hg_profile.timed
 def calc_adj_bv_equity(bal_sht, amort_schedule):
     adjusted_bv_equity = (
         bal_sht["total_stockholders_equity"][0] + amort_schedule["RD_Asset_Value"]
     )
-    logger.info(f"adjusted BV Equity = {adjusted_bv_equity:,.2f}")
+    logger.debug("adjusted BV Equity = %.2f", adjusted_bv_equity)
     return adjusted_bv_equity
 
 
+@hg_profile.timed
 def calc_bv_debt(bal_sht):
     bv_debt = (
         bal_sht["short_term_debt"][0]
@@ -312,68 +423,80 @@ def calc_bv_debt(bal_sht):
         + bal_sht["long_term_debt"][0]
         + bal_sht["capitalLeaseObligationsNonCurrent"][0]
     )
-    # logger.info(f"Current Long Term Debt {bal_sht['short_term_debt'][0]:,.2f}")
-    # logger.info(f"Long Term Debt {bal_sht['long_term_debt'][0]:,.2f}")
-    # logger.info(f"Cash and Equivalents {bal_sht['cash_and_equivalents'][0]:,.2f}")
-    logger.info(f"BV Debt = {bv_debt:,.2f}")
+    # logger.debug(f"Current Long Term Debt {bal_sht['short_term_debt'][0]:,.2f}")
+    # logger.debug(f"Long Term Debt {bal_sht['long_term_debt'][0]:,.2f}")
+    # logger.debug(f"Cash and Equivalents {bal_sht['cash_and_equivalents'][0]:,.2f}")
+    logger.debug("BV Debt = %.2f", bv_debt)
     return bv_debt
 
 
+@hg_profile.timed
 def calc_tax_rate(inc_stmnt):
     eff_tax_rate = inc_stmnt["income_tax_expense"][0] / inc_stmnt["incomeBeforeTax"][0]
-    logger.info(f"Effective Tax Rate = {eff_tax_rate:,.4f}")
+    logger.debug("Effective Tax Rate = %.4f", eff_tax_rate)
     return eff_tax_rate
 
 
+@hg_profile.timed
 def calc_return_on_capital(adjusted_ebiat, adjusted_bv_equity, bv_debt, bal_sht):
     return_on_capital = adjusted_ebiat / (
         adjusted_bv_equity + bv_debt - bal_sht["cash_and_equivalents"][0]
     )
-    logger.info(f"ROIC = {return_on_capital:,.4f}")
+    logger.debug("ROIC = %.4f", return_on_capital)
     return return_on_capital
 
 
+@hg_profile.timed
 def calc_growth_rate(reinvestment_rate, return_on_capital):
     growth_rate = reinvestment_rate * return_on_capital
-    logger.info(f"Growth Rate = {growth_rate:,.4f}")
+    logger.debug("Growth Rate = %.4f", growth_rate)
     return growth_rate
 
 
-def calc_discount_rate(inc_stmnt, bv_debt, adjusted_bv_equity, beta):
-    # Discount rate for free cah flow to the firm = cost of capital
-    # The cost of capital is the weighted average of the cost of equity and the cost of debt
-    # Cost of equity = risk free rate + Beta(Implied Equity Risk Premium)
-
-    cost_of_equity = RISK_FREE + (beta * EQ_PREM)
-    logger.info(f"COE = {cost_of_equity:,.4}")
-
+@hg_profile.timed
+def calc_interest_coverage(inc_stmnt):
     try:
         int_cover = inc_stmnt["ebit"][0] / inc_stmnt["interest_expense"][0]
     except ZeroDivisionError:
         int_cover = 25  # forces default spread to the lowest level
 
-    logger.info(f"operating Income {inc_stmnt['ebit'][0]}")
-    logger.info(f"interest expense {inc_stmnt['interest_expense'][0]}")
-    logger.info(f"Interest Coverage = {int_cover}")
+    logger.debug("operating Income %s", inc_stmnt["ebit"][0])
+    logger.debug("interest expense %s", inc_stmnt["interest_expense"][0])
+    logger.debug("Interest Coverage = %s", int_cover)
+    return int_cover
+
+
+@hg_profile.timed
+def calc_discount_rate(inc_stmnt, bv_debt, adjusted_bv_equity, beta, ctx=None):
+    # Discount rate for free cah flow to the firm = cost of capital
+    # The cost of capital is the weighted average of the cost of equity and the cost of debt
+    # Cost of equity = risk free rate + Beta(Implied Equity Risk Premium)
+    ctx = ctx or CONTEXT
+
+    cost_of_equity = ctx.risk_free + (beta * ctx.eq_prem)
+    logger.debug("COE = %.4g", cost_of_equity)
+
+    int_cover = calc_interest_coverage(inc_stmnt)
     def_spread = hg_fmplib.get_default_spread(int_cover)
-    logger.info(f"Default Spread = {def_spread}")
+    logger.debug("Default Spread = %s", def_spread)
 
     # 2. Calcultate after tax cost of debt
-    cost_of_debt = (RISK_FREE + def_spread) * (1 - MARGINAL_TAX_RATE)
-    logger.info(f"Cost of Debt = {cost_of_debt}")
+    cost_of_debt = (ctx.risk_free + def_spread) * (1 - MARGINAL_TAX_RATE)
+    logger.debug("Cost of Debt = %s", cost_of_debt)
     percent_debt = bv_debt / (adjusted_bv_equity + bv_debt)
     percent_equity = 1 - percent_debt
-    logger.info(f"% Debt {percent_debt:,.4f}")
-    logger.info(f"% Equity {percent_equity:,.4f}")
+    logger.debug("%% Debt %.4f", percent_debt)
+    logger.debug("%% Equity %.4f", percent_equity)
 
     # 3 calcualte the weighted cost of capital
     cost_of_capital = (cost_of_debt * percent_debt) + (cost_of_equity * percent_equity)
-    logger.info(f"Cost of Capital = {cost_of_capital:,.4f}")
+    logger.debug("Cost of Capital = %.4f", cost_of_capital)
 
     return cost_of_capital
 
 
-def calc_expected_fcff(adjusted_ebiat, growth_rate, reinvestment_rate):
+@hg_profile.timed
+def calc_expected_fcff(adjusted_ebiat, growth_rate, reinvestment_rate, growth_period):
     # change this calculation to estimate the ebit and the use the reinvestment rate to calculate the expected FCFF
 
     value_dict = {}
@@ -381,7 +504,7 @@ def calc_expected_fcff(adjusted_ebiat, growth_rate, reinvestment_rate):
     for k in keys:
         value_dict[k] = []
 
-    for year in range(GROWTH_PERIOD):
+    for year in range(growth_period):
         if year == 0:
             value_dict["ebiat_n"].append(adjusted_ebiat * (1 + growth_rate))
         else:
@@ -393,30 +516,36 @@ def calc_expected_fcff(adjusted_ebiat, growth_rate, reinvestment_rate):
             value_dict["ebiat_n"][year] * (1 - reinvestment_rate)
         )
     for val in value_dict["fcff_n"]:
-        logger.info(f"Expected FCFF = {val:,.2f}")
+        logger.debug("Expected FCFF = %.2f", val)
 
     return value_dict["fcff_n"]
 
 
+@hg_profile.timed
 def calc_fcff_value(fcff_table, discount_rate):
     fcff_value = 0
-    for year in range(GROWTH_PERIOD):
+    for year in range(len(fcff_table)):
         fcff_pv = fcff_table[year] / ((1 + discount_rate) ** (year + 1))
         fcff_value += fcff_pv
-        logger.info(f"Year: {year}")
-    logger.info(f"FCFF Value = {fcff_value:,.2f}")
+        logger.debug("Year: %s", year)
+    logger.debug("FCFF Value = %.2f", fcff_value)
     return fcff_value
 
 
-def calc_terminal_value(fcff_last, stable_cost_of_capital, growth_cost_of_capital):
-    terminal_value = (fcff_last * (1 + RISK_FREE)) / (
-        stable_cost_of_capital - RISK_FREE
+@hg_profile.timed
+def calc_terminal_value(
+    fcff_last, stable_cost_of_capital, growth_cost_of_capital, growth_period, ctx=None
+):
+    risk_free = (ctx or CONTEXT).risk_free
+    terminal_value = (fcff_last * (1 + risk_free)) / (
+        stable_cost_of_capital - risk_free
     )
-    terminal_value_pv = terminal_value / ((1 + growth_cost_of_capital) ** GROWTH_PERIOD)
-    logger.info(f"Terminal Value = {terminal_value_pv:,.2f}")
+    terminal_value_pv = terminal_value / ((1 + growth_cost_of_capital) ** growth_period)
+    logger.debug("Terminal Value = %.2f", terminal_value_pv)
     return terminal_value_pv
 
 
+@hg_profile.timed
 def calc_intrinsic_value(
     fcff_pv,
     terminal_value_pv,
@@ -426,31 +555,30 @@ def calc_intrinsic_value(
 ):
     enterprise_value = fcff_pv + terminal_value_pv + cash_and_equivalents - bv_debt
     intrinsic_value = enterprise_value / shares_outstanding
-    logger.info(f"Enterprise Value = {enterprise_value:,.2f}")
-    logger.info(f"Intrinsic Value = {intrinsic_value:,.2f}")
+    logger.debug("Enterprise Value = %.2f", enterprise_value)
+    logger.debug("Intrinsic Value = %.2f", intrinsic_value)
     return intrinsic_value
 
 
-# ## Main() Function
+# ## Valuation pipeline
 
 
-def main():
-    inc_stmnt = income_statement(COMPANY, MY_API_KEY)
-    logger.info(f"Inc Stmnt {inc_stmnt}")
-    bal_sht = balance_sheet(COMPANY, MY_API_KEY)
-    logger.info(f"Bal Sheet {bal_sht}")
-    cash_flw = cash_flow_statement(COMPANY, MY_API_KEY)
-    logger.info(f"Cash Flow {cash_flw}")
-    ent_quote = enterprise_quote(COMPANY, MY_API_KEY)
-    logger.info(f"Ent Quote {ent_quote}")
-    valuation_date = str(date.today())
-    # Add exchange to this
-    price = ent_quote[0]
-    shares_outstanding = ent_quote[1]
-    logger.info(f"Shares Outstanding: {shares_outstanding}")
-    market_cap = ent_quote[2]
-    ent_name = ent_quote[3]
-    stable_beta = calc_stable_beta(UNLEVERED_BETA)
+@dataclass
+class Fundamentals:
+    """Statement derived inputs to a ticker's valuation."""
+
+    adjusted_ebiat: float
+    reinvestment_rate: float
+    return_on_capital: float
+    interest_coverage: float
+    adjusted_bv_equity: float
+    bv_debt: float
+    cash_and_equivalents: float
+
+
+@hg_profile.timed
+def calc_fundamentals(inc_stmnt, bal_sht, cash_flw, rdTable, rd_years):
+    """Run the statement side of the model, up to ROIC and reinvestment rate."""
     eff_tax_rate = calc_tax_rate(inc_stmnt)
     fcff_data = calc_fcff(inc_stmnt, bal_sht, cash_flw, eff_tax_rate)
 
@@ -458,10 +586,9 @@ def main():
     capex = fcff_data[1]
     chng_nc_wc = fcff_data[2]
     depreciation = fcff_data[3]
-    curr_yr_fcff = fcff_data[4]
 
-    amort_schedule = capitalizerAndD(COMPANY, RD_YEARS, MY_API_KEY)
-    logger.info(f"Amortization Schedule {amort_schedule}")
+    amort_schedule = capitalizerAndD(rdTable, rd_years)
+    logger.debug("Amortization Schedule %s", amort_schedule)
     adjusted_ebiat = calc_adj_ebiat(ebiat, amort_schedule)
     firm_reinvestment = calc_reinvestment(
         capex, depreciation, chng_nc_wc, amort_schedule
@@ -470,72 +597,623 @@ def main():
     adjusted_bv_equity = calc_adj_bv_equity(bal_sht, amort_schedule)
     bv_debt = calc_bv_debt(bal_sht)
     reinvestment_rate = firm_reinvestment / adjusted_ebiat
-    logger.info(f"Reinvestment rate = {reinvestment_rate:,.4f}")
+    logger.debug("Reinvestment rate = %.4f", reinvestment_rate)
 
     return_on_capital = calc_return_on_capital(
         adjusted_ebiat, adjusted_bv_equity, bv_debt, bal_sht
     )
+    return Fundamentals(
+        adjusted_ebiat,
+        reinvestment_rate,
+        return_on_capital,
+        calc_interest_coverage(inc_stmnt),
+        adjusted_bv_equity,
+        bv_debt,
+        bal_sht["cash_and_equivalents"][0],
+    )
+
+
+@hg_profile.timed
+def input_fingerprint(statements, growth_period, unlevered_beta, rd_years, ctx):
+    """Hash of everything but the quote that a valuation depends on.
+
+    Covers the statement arrays fed to calc_fcff, capitalizerAndD and
+    calc_discount_rate, the industry beta and R&D life, the growth period and
+    the market parameters. Two runs with the same fingerprint produce the same
+    enterprise value.
+    """
+    digest = hashlib.sha256()
+    for statement in (statements.income, statements.balance, statements.cash_flow):
+        digest.update(statement.values.tobytes())
+    digest.update(
+        repr(
+            (
+                growth_period,
+                unlevered_beta,
+                rd_years,
+                ctx.eq_prem,
+                ctx.risk_free,
+                MARGINAL_TAX_RATE,
+            )
+        ).encode()
+    )
+    return digest.hexdigest()
+
+
+@hg_profile.timed
+def refresh_valuation(previous, ent_quote, valuation_date=None):
+    """Reprice a previous valuation whose inputs haven't changed.
+
+    The equity value carries over, so only the per share value (for a new
+    share count) and the margins against the new price are recomputed.
+    """
+    price, shares_outstanding, market_cap, ent_name = ent_quote
+    share_value = (
+        previous.share_value * previous.shares_outstanding / shares_outstanding
+    )
+    return replace(
+        previous,
+        valuation_date=valuation_date or str(date.today()),
+        ent_name=ent_name,
+        market_cap=market_cap,
+        price=price,
+        shares_outstanding=shares_outstanding,
+        share_value=share_value,
+        margin_of_safety=float(share_value - price),
+        margin_of_safety_pc=1 - (price / share_value),
+        implied_growth_rate=None,
+    )
+
+
+@hg_profile.timed(ticker_arg=0)
+def value_company(
+    company,
+    growth_period,
+    statements=None,
+    ent_quote=None,
+    ctx=None,
+    valuation_date=None,
+    previous=None,
+):
+    """Run the full FCFF valuation for one ticker and return a Stock_Value.
+
+    Industry, beta and R&D amortization years come from the context (the
+    module's CONTEXT unless one is passed), so the function can be called for
+    many companies from the same process. The statements and quote are
+    fetched unless the caller already has them, e.g. from
+    hg_fmplib.get_quotes; all the missing requests run concurrently through
+    hg_async. valuation_date defaults to today.
+
+    When previous (the ticker's last Stock_Value) was computed from the same
+    inputs, it is only repriced with refresh_valuation.
+    """
+    ctx = ctx or CONTEXT
+    industry = ctx.industry(company)
+    params = ctx.industry_params(industry)
+    rd_years = params.rd_years
+    unlevered_beta = params.unlevered_beta
+
+    if statements is None or ent_quote is None:
+        # Whatever is missing is fetched in one round of concurrent requests
+        statements, ent_quote = hg_async.get_ticker_inputs(
+            company, ctx.api_key, statements, ent_quote
+        )
+    input_hash = input_fingerprint(
+        statements, growth_period, unlevered_beta, rd_years, ctx
+    )
+    if previous is not None and previous.input_hash == input_hash:
+        logger.debug("%s inputs unchanged, refreshing price", company)
+        return refresh_valuation(previous, ent_quote, valuation_date)
+    inc_stmnt = statements.inc_stmnt()
+    logger.debug("Inc Stmnt %s", inc_stmnt)
+    bal_sht = statements.bal_sheet()
+    logger.debug("Bal Sheet %s", bal_sht)
+    cash_flw = statements.cash_flow_stmnt()
+    logger.debug("Cash Flow %s", cash_flw)
+    logger.debug("Ent Quote %s", ent_quote)
+    valuation_date = valuation_date or str(date.today())
+    # Add exchange to this
+    price = ent_quote[0]
+    shares_outstanding = ent_quote[1]
+    logger.debug("Shares Outstanding: %s", shares_outstanding)
+    market_cap = ent_quote[2]
+    ent_name = ent_quote[3]
+    stable_beta = params.stable_beta
+    fundamentals = calc_fundamentals(
+        inc_stmnt, bal_sht, cash_flw, statements.rAndD(rd_years), rd_years
+    )
+    adjusted_ebiat = fundamentals.adjusted_ebiat
+    reinvestment_rate = fundamentals.reinvestment_rate
+    return_on_capital = fundamentals.return_on_capital
+    adjusted_bv_equity = fundamentals.adjusted_bv_equity
+    bv_debt = fundamentals.bv_debt
     growth_rate = calc_growth_rate(reinvestment_rate, return_on_capital)
     discount_rate = calc_discount_rate(
-        inc_stmnt, bv_debt, adjusted_bv_equity, UNLEVERED_BETA
+        inc_stmnt, bv_debt, adjusted_bv_equity, unlevered_beta, ctx
     )
-    logger.info(f"disc rate {discount_rate:,.4}")
+    logger.debug("disc rate %.4g", discount_rate)
 
-    fcff_table = calc_expected_fcff(adjusted_ebiat, growth_rate, reinvestment_rate)
+    fcff_table = calc_expected_fcff(
+        adjusted_ebiat, growth_rate, reinvestment_rate, growth_period
+    )
 
     fcff_pv = calc_fcff_value(fcff_table, discount_rate)
     terminal_cost_of_capital = calc_discount_rate(
-        inc_stmnt, bv_debt, adjusted_bv_equity, stable_beta
+        inc_stmnt, bv_debt, adjusted_bv_equity, stable_beta, ctx
     )
     terminal_value_pv = calc_terminal_value(
-        fcff_table[-1], terminal_cost_of_capital, discount_rate
+        fcff_table[-1], terminal_cost_of_capital, discount_rate, growth_period, ctx
     )
 
     intrinsic_value = calc_intrinsic_value(
         fcff_pv,
         terminal_value_pv,
-        bal_sht["cash_and_equivalents"][0],
+        fundamentals.cash_and_equivalents,
         bv_debt,
         shares_outstanding,
     )
     safety_margin = float(intrinsic_value - price)
-    logger.info(f"Safety Margin: {safety_margin:,.2f}")
+    logger.debug("Safety Margin: %.2f", safety_margin)
     safety_margin_pc = 1 - (price / intrinsic_value)
     if return_on_capital > discount_rate:
-        logger.info("Wealth Creator")
+        logger.debug("Wealth Creator")
     else:
-        logger.info("Wealth Detroyer")
+        logger.debug("Wealth Detroyer")
     wealth_pc = return_on_capital - discount_rate
-    try:
-        valuation = Stock_Value(
-            COMPANY,
-            valuation_date,
-            ent_name,
-            INDUSTRY,
-            UNLEVERED_BETA,
-            market_cap,
-            price,
-            shares_outstanding,
-            RISK_FREE,
-            EQ_PREM,
-            growth_rate,
-            discount_rate,
-            wealth_pc,
-            fcff_pv,
-            terminal_value_pv,
-            intrinsic_value,
-            safety_margin,
-            safety_margin_pc,
+    valuation = Stock_Value(
+        company,
+        valuation_date,
+        ent_name,
+        industry,
+        unlevered_beta,
+        market_cap,
+        price,
+        shares_outstanding,
+        ctx.risk_free,
+        ctx.eq_prem,
+        growth_rate,
+        discount_rate,
+        wealth_pc,
+        fcff_pv,
+        terminal_value_pv,
+        intrinsic_value,
+        safety_margin,
+        safety_margin_pc,
+        input_hash,
+    )
+    logger.debug("%s", valuation)
+    return valuation
+
+
+def implied_growth_inputs(valuations, growth_period):
+    """dcf_kernel inputs that reproduce each Stock_Value, as arrays.
+
+    The growth period FCFF, the stable cost of capital and the net cash are
+    recovered from the stored present values, so rows can be re-solved
+    without the statements. The base FCFF goes in as adjusted_ebiat with no
+    reinvestment.
+    """
+    g, r, rf, shares, fcff_value, terminal_value, share_value = (
+        np.array([getattr(v, f) for v in valuations], dtype=float)
+        for f in (
+            "growth_rate",
+            "cost_of_capital",
+            "risk_free_rate",
+            "shares_outstanding",
+            "fcff_value",
+            "terminal_value",
+            "share_value",
+        )
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        base_fcff = fcff_value / hg_dcf.growth_pv_factor(g, r, growth_period)
+        terminal_multiple = (
+            terminal_value
+            * (1 + r) ** growth_period
+            / (base_fcff * (1 + g) ** growth_period)
+        )
+        stable_cost = rf + (1 + rf) / terminal_multiple
+    return dict(
+        adjusted_ebiat=base_fcff,
+        reinvestment_rate=0.0,
+        discount_rate=r,
+        stable_cost_of_capital=stable_cost,
+        growth_period=growth_period,
+        risk_free=rf,
+        cash_and_equivalents=share_value * shares - fcff_value - terminal_value,
+        bv_debt=0.0,
+        shares_outstanding=shares,
+    )
+
+
+@hg_profile.timed
+def with_implied_growth(valuations, growth_period):
+    """Set implied_growth_rate on a batch of Stock_Values in one vectorized solve.
+
+    The market implied growth rate is the growth over the growth period at
+    which the model's share value equals the price, holding the cost of
+    capital, reinvestment and terminal value assumptions fixed. It's None
+    where no growth rate within hg_dcf.IMPLIED_BOUNDS gets there.
+    """
+    if not valuations:
+        return []
+    implied = hg_dcf.implied_rate(
+        [v.price for v in valuations],
+        implied_growth_inputs(valuations, growth_period),
+    )
+    return [
+        replace(v, implied_growth_rate=float(g) if np.isfinite(g) else None)
+        for v, g in zip(valuations, implied)
+    ]
+
+
+def value_universe(
+    tickers,
+    growth_period,
+    workers=DEFAULT_WORKERS,
+    batch_size=hg_store.DEFAULT_BATCH_SIZE,
+    ctx=None,
+    full=False,
+):
+    """Value a list of tickers concurrently and write the results to the db.
+
+    Quotes for the whole list are fetched up front with the batched
+    hg_fmplib.get_quotes, and tickers are grouped by industry so each
+    industry's beta and R&D years are resolved once before any work starts.
+    Tickers whose latest stored valuation has the same input fingerprint are
+    only repriced, unless full is set. Each ticker's statement fetch ->
+    calc_* pipeline then runs on a thread pool of `workers` threads, one
+    industry after another; the network round-trips dominate, so throughput
+    scales with the worker count. Finished rows go to a ValuationStore on the
+    calling thread, which commits them batch_size at a time after solving
+    the batch's implied growth rates together. A ticker that fails is logged
+    and skipped so one bad filing doesn't stop the run.
+
+    Returns the list of Stock_Value objects that were written.
+    """
+    ctx = ctx or CONTEXT
+    if workers > hg_fmplib.HTTP_POOL_SIZE:
+        hg_fmplib.configure_http(pool_size=workers)
+        hg_async.configure(workers)
+    hg_cache.CACHE.purge_expired()
+
+    groups, failed = group_by_industry(tickers, ctx)
+    logger.info("%s tickers in %s industries", len(tickers), len(groups))
+    quotes = hg_fmplib.get_quotes(tickers, ctx.api_key, workers=workers)
+
+    valuations = []
+    refreshed = 0
+    pending = []
+
+    def store_batch():
+        solved = with_implied_growth(pending, growth_period)
+        store.add_many(solved)
+        valuations.extend(solved)
+        pending.clear()
+
+    with (
+        ThreadPoolExecutor(max_workers=workers) as pool,
+        hg_store.ValuationStore(VALUATION_DB, batch_size) as store,
+    ):
+        previous = {}
+        if not full:
+            previous = {
+                ticker: Stock_Value(*row)
+                for ticker, row in hg_store.latest_valuations(
+                    store.conn, tickers
+                ).items()
+            }
+        futures = {
+            pool.submit(
+                value_company,
+                ticker,
+                growth_period,
+                None,
+                quotes.get(ticker),
+                ctx,
+                None,
+                previous.get(ticker),
+            ): ticker
+            for members in groups.values()
+            for ticker in members
+        }
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                valuation = future.result()
+            except Exception as e:
+                failed.append(ticker)
+                logger.warning("Valuation failed for %s: %s", ticker, e)
+                continue
+            pending.append(valuation)
+            last = previous.get(ticker)
+            if last is not None and last.input_hash == valuation.input_hash:
+                refreshed += 1
+            if len(pending) >= batch_size:
+                store_batch()
+        store_batch()
+
+    logger.info(
+        "Valued %s tickers (%s repriced only), %s failed",
+        len(valuations),
+        refreshed,
+        len(failed),
+    )
+    return valuations
+
+
+@hg_profile.timed(ticker_arg=0)
+def simulate_company(company, growth_period, spec=None, ctx=None):
+    """Monte Carlo valuation of one ticker around its point estimate inputs.
+
+    Returns an hg_dcf.MonteCarloResult with percentiles of intrinsic value and
+    the probability that the margin of safety is positive.
+    """
+    ctx = ctx or CONTEXT
+    industry = ctx.industry(company)
+    params = ctx.industry_params(industry)
+    rd_years = params.rd_years
+    unlevered_beta = params.unlevered_beta
+
+    statements, ent_quote = hg_async.get_ticker_inputs(company, ctx.api_key)
+    inc_stmnt = statements.inc_stmnt()
+    fundamentals = calc_fundamentals(
+        inc_stmnt,
+        statements.bal_sheet(),
+        statements.cash_flow_stmnt(),
+        statements.rAndD(rd_years),
+        rd_years,
+    )
+    price, shares_outstanding, market_cap, ent_name = ent_quote
+    bv_debt = fundamentals.bv_debt
+    result = hg_dcf.monte_carlo(
+        fundamentals.adjusted_ebiat,
+        fundamentals.reinvestment_rate,
+        fundamentals.return_on_capital,
+        unlevered_beta,
+        ctx.eq_prem,
+        ctx.risk_free,
+        hg_fmplib.get_default_spread(fundamentals.interest_coverage),
+        bv_debt / (fundamentals.adjusted_bv_equity + bv_debt),
+        MARGINAL_TAX_RATE,
+        growth_period,
+        fundamentals.cash_and_equivalents,
+        bv_debt,
+        shares_outstanding,
+        price,
+        spec,
+    )
+    logger.info(
+        "%s Monte Carlo: median %s, P(margin of safety > 0) = %.3f",
+        company,
+        result.percentiles.get(50),
+        result.prob_margin_of_safety,
+    )
+    return result
+
+
+def simulate_universe(
+    tickers, growth_period, spec=None, workers=DEFAULT_WORKERS, ctx=None
+):
+    """Run simulate_company over a list of tickers on a thread pool.
+
+    Returns a dict of ticker -> MonteCarloResult; failed tickers are logged and
+    left out.
+    """
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(simulate_company, ticker, growth_period, spec, ctx): ticker
+            for ticker in tickers
+        }
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                results[ticker] = future.result()
+            except Exception as e:
+                logger.warning("Monte Carlo failed for %s: %s", ticker, e)
+    return results
+
+
+# ## Sensitivity grid
+
+SENSITIVITY_POINTS = 11
+
+
+def sensitivity_axes(growth_period, risk_free, points=SENSITIVITY_POINTS):
+    """Default grid axes for a batch.
+
+    Growth periods 1..2 x growth_period, cost of capital from 1% to 10% over
+    the risk free rate, growth from 0% to 15% and stable cost of capital from
+    1% to 6% over the risk free rate, `points` values each.
+    """
+    return (
+        list(range(1, 2 * growth_period + 1)),
+        np.linspace(risk_free + 0.01, risk_free + 0.10, points),
+        np.linspace(0.0, 0.15, points),
+        np.linspace(risk_free + 0.01, risk_free + 0.06, points),
+    )
+
+
+def sensitivity_universe(
+    tickers,
+    growth_period,
+    axes=None,
+    max_concurrent=hg_async.MAX_CONCURRENT_REQUESTS,
+    ctx=None,
+):
+    """Evaluate intrinsic value over a sensitivity grid for a batch of tickers.
+
+    Statements and quotes are fetched concurrently, each ticker's statements
+    run through calc_fundamentals, and the whole batch is then evaluated in
+    one hg_dcf.sensitivity_grid call. axes is (growth periods, costs of
+    capital, growth rates, stable costs of capital) and defaults to
+    sensitivity_axes. Returns the tickers valued and the grid, whose
+    intrinsic_value has a leading axis in the same ticker order.
+    """
+    ctx = ctx or CONTEXT
+    inputs = hg_async.get_universe_inputs(tickers, ctx.api_key, max_concurrent)
+
+    valued, fundamentals, quotes = [], [], []
+    for ticker in tickers:
+        if ticker not in inputs:
+            continue
+        statements, ent_quote = inputs[ticker]
+        try:
+            rd_years = ctx.rd_years(ctx.industry(ticker))
+            fundamentals.append(
+                calc_fundamentals(
+                    statements.inc_stmnt(),
+                    statements.bal_sheet(),
+                    statements.cash_flow_stmnt(),
+                    statements.rAndD(rd_years),
+                    rd_years,
+                )
+            )
+        except Exception as e:
+            logger.warning("Sensitivity failed for %s: %s", ticker, e)
+            continue
+        valued.append(ticker)
+        quotes.append(ent_quote)
+
+    grid = hg_dcf.sensitivity_grid(
+        [f.adjusted_ebiat for f in fundamentals],
+        [f.reinvestment_rate for f in fundamentals],
+        *(axes or sensitivity_axes(growth_period, ctx.risk_free)),
+        ctx.risk_free,
+        [f.cash_and_equivalents for f in fundamentals],
+        [f.bv_debt for f in fundamentals],
+        [q[1] for q in quotes],
+    )
+    return valued, grid
+
+
+def write_sensitivity_csv(path, tickers, grid):
+    """Write a batch grid in long form, one row per ticker and grid cell."""
+    axes = (
+        grid.growth_periods,
+        grid.discount_rates,
+        grid.growth_rates,
+        grid.stable_costs,
+    )
+    cells = [a.ravel() for a in np.meshgrid(*axes, indexing="ij")]
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            [
+                "ticker",
+                "growth_period",
+                "cost_of_capital",
+                "growth_rate",
+                "stable_cost_of_capital",
+                "share_value",
+            ]
         )
-        logger.info(valuation)
-    except Exception as e:
-        logger.debug(f"An exception occured: {e}")
+        for ticker, values in zip(tickers, grid.intrinsic_value):
+            writer.writerows(zip([ticker] * len(cells[0]), *cells, values.ravel()))
+
 
-    # write to db
-    create_table()
-    conn = sqlite3.connect("/Volumes/Financial_Data/valuation.db")
-    insert_valuation(conn, valuation)
+def read_tickers(path):
+    """Read one ticker per line from a text file, skipping blanks and # comments."""
+    with open(path) as f:
+        return [
+            line.strip().upper()
+            for line in f
+            if line.strip() and not line.strip().startswith("#")
+        ]
+
+
+# ## Main() Function
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="FCFF valuation of one or more tickers"
+    )
+    parser.add_argument("tickers", nargs="*", help="ticker symbols to value")
+    parser.add_argument(
+        "-f", "--file", help="text file with one ticker per line (batch mode)"
+    )
+    parser.add_argument(
+        "-g", "--growth-period", type=int, help="growth period in years"
+    )
+    parser.add_argument(
+        "-w",
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"concurrent ticker pipelines (default {DEFAULT_WORKERS})",
+    )
+    parser.add_argument(
+        "--monte-carlo",
+        type=int,
+        metavar="DRAWS",
+        help="report a Monte Carlo distribution of DRAWS draws instead of writing",
+    )
+    parser.add_argument("--seed", type=int, help="random seed for --monte-carlo")
+    parser.add_argument(
+        "--sensitivity",
+        metavar="CSV",
+        help="write intrinsic value over a growth period x cost of capital x "
+        "growth x stable cost grid to CSV instead of writing to the database",
+    )
+    parser.add_argument(
+        "--grid-points",
+        type=int,
+        default=SENSITIVITY_POINTS,
+        help=f"values per rate axis for --sensitivity (default {SENSITIVITY_POINTS})",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="recompute every ticker even if its inputs are unchanged",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="REPORT",
+        help="time every fetch and calc step and write a JSON run report",
+    )
+    parser.add_argument(
+        "--profile-db",
+        action="store_true",
+        help="also write the run profile to the run_profile table",
+    )
+    args = parser.parse_args(argv)
+    hg_logging.setup_logging()
+    if args.profile or args.profile_db:
+        hg_profile.enable()
+        hg_profile.PROFILER.reset()
+
+    tickers = [t.upper() for t in args.tickers]
+    if args.file:
+        tickers += read_tickers(args.file)
+    if not tickers:
+        tickers = [input("Input company ticker: ").upper()]
+    growth_period = args.growth_period
+    if growth_period is None:
+        growth_period = int(input("Input growth period: "))
+
+    if args.sensitivity:
+        axes = sensitivity_axes(growth_period, CONTEXT.risk_free, args.grid_points)
+        valued, grid = sensitivity_universe(tickers, growth_period, axes)
+        write_sensitivity_csv(args.sensitivity, valued, grid)
+    elif args.monte_carlo:
+        spec = hg_dcf.MonteCarloSpec(draws=args.monte_carlo, seed=args.seed)
+        results = simulate_universe(tickers, growth_period, spec, args.workers)
+        for ticker in tickers:
+            if ticker not in results:
+                continue
+            result = results[ticker]
+            pct = "  ".join(f"p{k} {v:,.2f}" for k, v in result.percentiles.items())
+            print(f"{ticker:<8} {pct}  P(MoS>0) {result.prob_margin_of_safety:.3f}")
+    else:
+        value_universe(tickers, growth_period, args.workers, full=args.full)
 
+    if args.profile:
+        hg_profile.PROFILER.write_json(args.profile)
+    if args.profile_db:
+        with sqlite3.connect(VALUATION_DB) as conn:
+            hg_profile.PROFILER.write_table(conn)
     print("DONE")
 
 
@@ -0,0 +1,423 @@
+"""
+Streaming valuation pipeline for large ticker lists.
+
+    python src/fmp_pipeline.py -f universe.txt -g 5
+    python src/fmp_pipeline.py -f universe.txt --fetch-workers 32 --valuation-workers 6
+
+The network bound fetches and the CPU bound parsing and calc_* chain run in
+separate stages that overlap:
+
+    fetch      threads fetching each ticker's raw statement payloads and
+               quote (hg_async) into the fetch queue
+    valuation  a process pool parsing the payloads and running
+               fmp_fcff.value_company
+    write      the calling thread, solving each batch's implied growth and
+               writing it to the valuation table with a ValuationStore
+
+Both hand-offs are bounded: the fetch queue holds at most queue_size tickers
+and at most queue_size valuations are in the process pool or waiting for the
+writer. A slow stage therefore stalls the ones before it instead of letting
+results pile up, and tickers are read from the iterable only as fetch workers
+free up, so memory stays flat however long the list is.
+
+The depth of each stage is sampled every metrics_interval seconds. A fetch
+queue that stays full means valuation is the bottleneck, one that stays
+empty means fetching is.
+
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+import fmp_fcff
+import hg_async
+import hg_cache
+import hg_fmplib
+import hg_logging
+import hg_store
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FETCH_WORKERS = 16
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_METRICS_INTERVAL = 5.0
+# Requests a fetch worker has in flight at once: three statements and the
+# profile and shares-float of the quote
+REQUESTS_PER_TICKER = len(hg_fmplib.STATEMENT_ENDPOINTS) + 2
+STAGES = ("fetch_queue", "valuation", "write_queue")
+
+# Put on a queue by a stage that has nothing more to send
+DONE = None
+
+# Valuation workers start from a fresh interpreter (forkserver, or spawn where
+# that isn't available) rather than forking the threaded parent, which can
+# deadlock on a lock held by another thread at the time of the fork.
+START_METHOD = (
+    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+)
+
+
+def init_worker(log_queue, level):
+    """Valuation pool initializer: logging to the parent, the spread table.
+
+    The default spread table is read once per worker here rather than by the
+    first valuation it runs.
+    """
+    if log_queue is not None:
+        hg_logging.setup_worker_logging(log_queue, level)
+    hg_fmplib.get_default_spread_table()
+
+
+def value_raw(
+    company,
+    growth_period,
+    raw_statements,
+    ent_quote,
+    params,
+    eq_prem,
+    risk_free,
+    previous=None,
+):
+    """Parse a ticker's raw payloads and value it; runs in a worker process.
+
+    The industry parameters and market inputs come from the parent, so the
+    worker reads nothing but the default spread sheet.
+    """
+    ctx = fmp_fcff.ValuationContext(eq_prem, risk_free)
+    ctx.preset_industry(company, params)
+    statements = hg_fmplib.bundle_statements(company, *raw_statements)
+    return fmp_fcff.value_company(
+        company, growth_period, statements, ent_quote, ctx, None, previous
+    )
+
+
+class PipelineMetrics:
+    """Stage counters and queue depth samples of a pipeline run.
+
+    Depths are kept as running count, total and max per stage, so a long run
+    doesn't accumulate samples.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.counters = dict.fromkeys(
+            ("fetched", "fetch_failed", "valued", "failed", "written"), 0
+        )
+        self.depths = {stage: [0, 0, 0] for stage in STAGES}  # samples, total, max
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def sample(self, depths):
+        with self._lock:
+            for stage, depth in depths.items():
+                samples = self.depths[stage]
+                samples[0] += 1
+                samples[1] += depth
+                samples[2] = max(samples[2], depth)
+
+    def summary(self):
+        with self._lock:
+            elapsed = time.perf_counter() - self.started
+            return {
+                "elapsed_s": elapsed,
+                "tickers_per_s": self.counters["written"] / elapsed,
+                "counters": dict(self.counters),
+                "depth": {
+                    stage: {
+                        "mean": total / samples if samples else 0.0,
+                        "max": high,
+                        "samples": samples,
+                    }
+                    for stage, (samples, total, high) in self.depths.items()
+                },
+            }
+
+
+class ValuationPipeline:
+    """Fetch threads -> process pool -> writer, joined by bounded queues.
+
+    One pipeline object runs once; see the module docstring for the stages.
+    """
+
+    def __init__(
+        self,
+        growth_period,
+        fetch_workers=DEFAULT_FETCH_WORKERS,
+        valuation_workers=None,
+        queue_size=DEFAULT_QUEUE_SIZE,
+        batch_size=hg_store.DEFAULT_BATCH_SIZE,
+        database=None,
+        ctx=None,
+        full=False,
+        metrics_interval=DEFAULT_METRICS_INTERVAL,
+    ):
+        self.growth_period = growth_period
+        self.fetch_workers = fetch_workers
+        self.valuation_workers = valuation_workers or os.cpu_count()
+        self.batch_size = batch_size
+        self.database = database or fmp_fcff.VALUATION_DB
+        self.ctx = ctx or fmp_fcff.CONTEXT
+        self.full = full
+        self.metrics_interval = metrics_interval
+        self.metrics = PipelineMetrics()
+
+        self.fetched = queue.Queue(maxsize=queue_size)
+        # Valuations submitted but not yet taken by the writer
+        self.slots = threading.BoundedSemaphore(queue_size)
+        self.results = queue.Queue()
+        self.in_pool = 0
+        self._in_pool_lock = threading.Lock()
+        self.error = None
+        self._tickers_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def run(self, tickers):
+        """Value every ticker in the iterable; returns the metrics summary."""
+        ctx = self.ctx
+        eq_prem, risk_free = ctx.eq_prem, ctx.risk_free
+        connections = self.fetch_workers * REQUESTS_PER_TICKER
+        if connections > hg_fmplib.HTTP_POOL_SIZE:
+            hg_fmplib.configure_http(pool_size=connections)
+            hg_async.configure(connections)
+        hg_cache.CACHE.purge_expired()
+        mp_context = multiprocessing.get_context(START_METHOD)
+        log_queue, log_listener = hg_logging.worker_log_queue(mp_context)
+
+        tickers = iter(tickers)
+        with hg_store.ValuationStore(self.database, self.batch_size) as store:
+            threads = [
+                threading.Thread(
+                    target=self._fetch, args=(tickers,), name=f"fetch-{i}", daemon=True
+                )
+                for i in range(self.fetch_workers)
+            ]
+            with ProcessPoolExecutor(
+                max_workers=self.valuation_workers,
+                mp_context=mp_context,
+                initializer=init_worker,
+                initargs=(log_queue, logger.getEffectiveLevel()),
+            ) as pool:
+                threads.append(
+                    threading.Thread(
+                        target=self._dispatch,
+                        args=(pool, eq_prem, risk_free),
+                        name="dispatch",
+                        daemon=True,
+                    )
+                )
+                threads.append(
+                    threading.Thread(target=self._monitor, name="metrics", daemon=True)
+                )
+                for thread in threads:
+                    thread.start()
+                try:
+                    self._write(store)
+                finally:
+                    self._stopped.set()
+        if log_listener is not None:
+            log_listener.stop()
+
+        if self.error is not None:
+            raise self.error
+        summary = self.metrics.summary()
+        logger.info(
+            "Pipeline wrote %s valuations in %.1f s (%.1f tickers/s), "
+            "%s fetch and %s valuation failures",
+            summary["counters"]["written"],
+            summary["elapsed_s"],
+            summary["tickers_per_s"],
+            summary["counters"]["fetch_failed"],
+            summary["counters"]["failed"],
+        )
+        return summary
+
+    def _next_ticker(self, tickers):
+        with self._tickers_lock:
+            return next(tickers, None)
+
+    def _fetch(self, tickers):
+        ctx = self.ctx
+        conn = None if self.full else sqlite3.connect(self.database)
+        try:
+            while (ticker := self._next_ticker(tickers)) is not None:
+                try:
+                    params = ctx.industry_params(ctx.industry(ticker))
+                    raw_statements, ent_quote = hg_async.get_raw_ticker_inputs(
+                        ticker, ctx.api_key
+                    )
+                    previous = None
+                    if conn is not None:
+                        row = hg_store.latest_valuations(conn, [ticker]).get(ticker)
+                        previous = fmp_fcff.Stock_Value(*row) if row else None
+                except Exception as e:
+                    self.metrics.count("fetch_failed")
+                    logger.warning("Fetch failed for %s: %s", ticker, e)
+                    continue
+                # Blocks while the fetch queue is full
+                self.fetched.put((ticker, raw_statements, ent_quote, params, previous))
+                self.metrics.count("fetched")
+        finally:
+            if conn is not None:
+                conn.close()
+            self.fetched.put(DONE)
+
+    def _dispatch(self, pool, eq_prem, risk_free):
+        try:
+            remaining = self.fetch_workers
+            while remaining:
+                task = self.fetched.get()
+                if task is DONE:
+                    remaining -= 1
+                    continue
+                ticker, raw_statements, ent_quote, params, previous = task
+                # Blocks while queue_size valuations are waiting on the writer
+                self.slots.acquire()
+                future = pool.submit(
+                    value_raw,
+                    ticker,
+                    self.growth_period,
+                    raw_statements,
+                    ent_quote,
+                    params,
+                    eq_prem,
+                    risk_free,
+                    previous,
+                )
+                with self._in_pool_lock:
+                    self.in_pool += 1
+                future.add_done_callback(partial(self._finished, ticker))
+            pool.shutdown(wait=True)
+        except Exception as e:
+            logger.error("Valuation stage stopped: %s", e)
+            self.error = e
+        finally:
+            self.results.put(DONE)
+
+    def _finished(self, ticker, future):
+        with self._in_pool_lock:
+            self.in_pool -= 1
+        self.results.put((ticker, future))
+
+    def _write(self, store):
+        pending = []
+
+        def store_batch():
+            solved = fmp_fcff.with_implied_growth(pending, self.growth_period)
+            store.add_many(solved)
+            self.metrics.count("written", len(solved))
+            pending.clear()
+
+        while (item := self.results.get()) is not DONE:
+            ticker, future = item
+            self.slots.release()
+            try:
+                pending.append(future.result())
+            except Exception as e:
+                self.metrics.count("failed")
+                logger.warning("Valuation failed for %s: %s", ticker, e)
+                continue
+            self.metrics.count("valued")
+            if len(pending) >= self.batch_size:
+                store_batch()
+        store_batch()
+
+    def _monitor(self):
+        while not self._stopped.wait(self.metrics_interval):
+            depths = {
+                "fetch_queue": self.fetched.qsize(),
+                "valuation": self.in_pool,
+                "write_queue": self.results.qsize(),
+            }
+            self.metrics.sample(depths)
+            logger.info(
+                "fetch queue %s, valuating %s, write queue %s, written %s",
+                depths["fetch_queue"],
+                depths["valuation"],
+                depths["write_queue"],
+                self.metrics.counters["written"],
+            )
+
+
+def print_summary(summary):
+    counters = summary["counters"]
+    print(
+        f"{counters['written']} written, {counters['fetch_failed']} fetch and "
+        f"{counters['failed']} valuation failures in {summary['elapsed_s']:.1f} s "
+        f"({summary['tickers_per_s']:.1f} tickers/s)"
+    )
+    print(f"{'stage':<14}{'mean depth':>12}{'max depth':>12}")
+    for stage, depth in summary["depth"].items():
+        print(f"{stage:<14}{depth['mean']:>12.1f}{depth['max']:>12}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Value a large ticker list with overlapping fetch and valuation"
+    )
+    parser.add_argument("tickers", nargs="*", help="ticker symbols to value")
+    parser.add_argument("-f", "--file", help="text file with one ticker per line")
+    parser.add_argument(
+        "-g", "--growth-period", type=int, default=5, help="growth period in years"
+    )
+    parser.add_argument(
+        "--fetch-workers", type=int, default=DEFAULT_FETCH_WORKERS, help="fetch threads"
+    )
+    parser.add_argument(
+        "--valuation-workers",
+        type=int,
+        help="valuation processes (default one per CPU)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help="tickers held between stages",
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="revalue tickers whose inputs are unchanged"
+    )
+    parser.add_argument(
+        "--metrics-interval",
+        type=float,
+        default=DEFAULT_METRICS_INTERVAL,
+        help="seconds between queue depth samples",
+    )
+    parser.add_argument("--metrics", metavar="JSON", help="write the run summary here")
+    args = parser.parse_args(argv)
+    hg_logging.setup_logging()
+
+    tickers = [t.upper() for t in args.tickers]
+    if args.file:
+        tickers += fmp_fcff.read_tickers(args.file)
+    if not tickers:
+        parser.error("no tickers given")
+
+    pipeline = ValuationPipeline(
+        args.growth_period,
+        args.fetch_workers,
+        args.valuation_workers,
+        args.queue_size,
+        full=args.full,
+        metrics_interval=args.metrics_interval,
+    )
+    summary = pipeline.run(tickers)
+    print_summary(summary)
+    if args.metrics:
+        with open(args.metrics, "w") as f:
+            json.dump(summary, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
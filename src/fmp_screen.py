@@ -0,0 +1,98 @@
+"""
+Screen the valuation database.
+
+    python src/fmp_screen.py --where "wealth_pc>0" --per-industry 5
+    python src/fmp_screen.py --industry "Semiconductor" --sort growth_rate
+    python src/fmp_screen.py --date 2026-09-30 --where "margin_of_safety_pc>=0.3"
+
+Ranks the latest valuation of every ticker (or one valuation date) with
+hg_store.screen and prints the result as a table. The database is opened
+read only; the valuation runs create and migrate it.
+
+"""
+
+import argparse
+import sqlite3
+import hg_store
+
+DEFAULT_COLUMNS = (
+    "ticker",
+    "valuation_date",
+    "industry",
+    "price",
+    "share_value",
+    "margin_of_safety_pc",
+    "wealth_pc",
+)
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return f"{value:,.4f}" if abs(value) < 10 else f"{value:,.2f}"
+    return str(value)
+
+
+def print_table(rows, columns):
+    table = [[format_value(row[c]) for c in columns] for row in rows]
+    widths = [max([len(c), *(len(r[i]) for r in table)]) for i, c in enumerate(columns)]
+    for r in [columns, *table]:
+        print("  ".join(v.ljust(w) for v, w in zip(r, widths)).rstrip())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Screen stored valuations")
+    parser.add_argument(
+        "-w",
+        "--where",
+        action="append",
+        default=[],
+        metavar="FILTER",
+        help='filter such as "wealth_pc>0"; repeat to combine',
+    )
+    parser.add_argument("-i", "--industry", help="only this industry")
+    parser.add_argument(
+        "-s", "--sort", default="margin_of_safety_pc", help="column to rank by"
+    )
+    parser.add_argument("--asc", action="store_true", help="rank ascending")
+    parser.add_argument("-n", "--limit", type=int, default=50, help="rows to show")
+    parser.add_argument(
+        "--per-industry", type=int, metavar="N", help="top N of each industry"
+    )
+    parser.add_argument(
+        "-d", "--date", help="screen this valuation date instead of the latest rows"
+    )
+    parser.add_argument(
+        "-c", "--columns", help="comma separated columns to show", default=None
+    )
+    parser.add_argument("--db", default=hg_store.VALUATION_DB)
+    args = parser.parse_args(argv)
+
+    columns = args.columns.split(",") if args.columns else list(DEFAULT_COLUMNS)
+    try:
+        filters = [hg_store.parse_filter(f) for f in args.where]
+        unknown = set(columns) - set(hg_store.VALUATION_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown columns {sorted(unknown)}")
+        conn = hg_store.connect_read_only(args.db)
+        try:
+            rows = hg_store.screen(
+                conn,
+                filters,
+                args.industry,
+                args.sort,
+                not args.asc,
+                args.limit,
+                args.per_industry,
+                args.date,
+            )
+        finally:
+            conn.close()
+    except ValueError as e:
+        parser.error(str(e))
+    except sqlite3.OperationalError as e:
+        parser.error(f"can't screen {args.db}: {e}")
+    print_table(rows, columns)
+
+
+if __name__ == "__main__":
+    main()
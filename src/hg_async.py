@@ -0,0 +1,220 @@
+"""
+asyncio variants of the hg_fmplib fetch functions.
+
+A ticker's requests (three statements, profile and shares-float) don't
+depend on each other, so the coroutines here issue them all at once and a
+ticker costs about as long as its slowest request. Many tickers can be
+fetched together under one limit on requests in flight.
+
+Each request still goes through hg_fmplib.fetch_fmp (response cache,
+pooled session, retries), run on a worker thread with asyncio.to_thread, so
+no extra HTTP dependency is needed. The plain functions at the end wrap the
+coroutines for synchronous callers. The per-ticker ones run on one shared,
+long-lived FetchLoop, so however many threads call them, the process has one
+limit on requests in flight and one pool of request threads.
+
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+
+import hg_fmplib
+from hg_fmplib import STATEMENT_ENDPOINTS, bundle_statements, safe_float
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Requests in flight at once; matches the shared session's connection pool.
+MAX_CONCURRENT_REQUESTS = hg_fmplib.HTTP_POOL_SIZE
+
+
+async def fetch_fmp_async(slots, endpoint, company, apiKey, **params):
+    """hg_fmplib.fetch_fmp on a worker thread, holding one of the request slots."""
+    async with slots:
+        return await asyncio.to_thread(
+            hg_fmplib.fetch_fmp, endpoint, company, apiKey, **params
+        )
+
+
+async def get_raw_statements_async(slots, company, apiKey, quarters=20):
+    """The raw income, balance sheet and cash flow payloads, fetched concurrently."""
+    return await asyncio.gather(
+        *(
+            fetch_fmp_async(
+                slots, endpoint, company, apiKey, period="quarter", limit=quarters
+            )
+            for endpoint in STATEMENT_ENDPOINTS
+        )
+    )
+
+
+async def get_statements_async(slots, company, apiKey, quarters=20):
+    """The three statements of a ticker, fetched concurrently.
+
+    The payloads are parsed on a worker thread, so the event loop keeps
+    dispatching other requests meanwhile.
+    """
+    raw_statements = await get_raw_statements_async(slots, company, apiKey, quarters)
+    return await asyncio.to_thread(bundle_statements, company, *raw_statements)
+
+
+async def get_quote_async(slots, company, apiKey):
+    """hg_fmplib.get_quote with profile and shares-float fetched concurrently."""
+    profile, shares = await asyncio.gather(
+        fetch_fmp_async(slots, "profile", company, apiKey),
+        fetch_fmp_async(slots, "shares-float", company, apiKey),
+    )
+    return (
+        safe_float(profile[0]["price"]),
+        safe_float(shares[0]["outstandingShares"]),
+        safe_float(profile[0]["marketCap"]),
+        profile[0]["companyName"],
+    )
+
+
+async def get_ticker_inputs_async(
+    slots, company, apiKey, statements=None, ent_quote=None
+):
+    """Statements and quote of a ticker, fetching whichever isn't given."""
+    statements_task = (
+        get_statements_async(slots, company, apiKey) if statements is None else None
+    )
+    quote_task = get_quote_async(slots, company, apiKey) if ent_quote is None else None
+    fetched = await asyncio.gather(*(t for t in (statements_task, quote_task) if t))
+    fetched = iter(fetched)
+    if statements_task:
+        statements = next(fetched)
+    if quote_task:
+        ent_quote = next(fetched)
+    return statements, ent_quote
+
+
+async def get_universe_inputs_async(
+    companies, apiKey, max_concurrent=MAX_CONCURRENT_REQUESTS
+):
+    """Statements and quotes of many tickers: ticker -> (bundle, quote).
+
+    Every ticker's requests are started together and at most max_concurrent
+    are in flight. A ticker whose fetch fails is logged and left out.
+    """
+    slots = asyncio.Semaphore(max_concurrent)
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=max_concurrent)
+    )
+    results = await asyncio.gather(
+        *(get_ticker_inputs_async(slots, company, apiKey) for company in companies),
+        return_exceptions=True,
+    )
+    inputs = {}
+    for company, result in zip(companies, results):
+        if isinstance(result, Exception):
+            logger.warning("Fetch failed for %s: %s", company, result)
+        else:
+            inputs[company] = result
+    return inputs
+
+
+# Synchronous wrappers
+
+
+class FetchLoop:
+    """An event loop on a daemon thread that synchronous callers share.
+
+    Coroutines submitted with run() from any thread share the request slots
+    and the executor the fetches run on, both sized max_concurrent.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_REQUESTS):
+        self.loop = asyncio.new_event_loop()
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_concurrent, thread_name_prefix="fetch"
+        )
+        self.loop.set_default_executor(self.executor)
+        self.slots = asyncio.Semaphore(max_concurrent)
+        threading.Thread(
+            target=self.loop.run_forever, name="fetch-loop", daemon=True
+        ).start()
+
+    def run(self, make_coro):
+        """Run make_coro(slots) on the loop and wait for its result."""
+        return asyncio.run_coroutine_threadsafe(
+            make_coro(self.slots), self.loop
+        ).result()
+
+    def resize(self, max_concurrent):
+        """Allow max_concurrent requests from now on.
+
+        Calls already waiting on the old slots finish under the old limit.
+        """
+
+        async def swap():
+            old = self.executor
+            self.executor = ThreadPoolExecutor(
+                max_workers=max_concurrent, thread_name_prefix="fetch"
+            )
+            self.loop.set_default_executor(self.executor)
+            self.slots = asyncio.Semaphore(max_concurrent)
+            old.shutdown(wait=False)
+
+        asyncio.run_coroutine_threadsafe(swap(), self.loop).result()
+
+
+_fetch_loop = None
+_fetch_loop_lock = threading.Lock()
+
+
+def get_fetch_loop():
+    """Return the process wide FetchLoop, starting it on first use."""
+    global _fetch_loop
+    if _fetch_loop is None:
+        with _fetch_loop_lock:
+            if _fetch_loop is None:
+                _fetch_loop = FetchLoop()
+    return _fetch_loop
+
+
+def configure(max_concurrent):
+    """Set the shared limit on requests in flight, e.g. to a larger HTTP pool.
+
+    Call it with hg_fmplib.configure_http before starting a large batch.
+    """
+    get_fetch_loop().resize(max_concurrent)
+
+
+def get_ticker_inputs(company, apiKey, statements=None, ent_quote=None):
+    """Blocking get_ticker_inputs_async for one ticker, on the shared loop."""
+    return get_fetch_loop().run(
+        lambda slots: get_ticker_inputs_async(
+            slots, company, apiKey, statements, ent_quote
+        )
+    )
+
+
+def get_raw_ticker_inputs(company, apiKey):
+    """Raw statement payloads and parsed quote of a ticker, fetched concurrently.
+
+    Runs on the shared loop. The payloads are left for the caller to parse
+    with hg_fmplib.bundle_statements, e.g. in another process.
+    """
+
+    async def fetch(slots):
+        return await asyncio.gather(
+            get_raw_statements_async(slots, company, apiKey),
+            get_quote_async(slots, company, apiKey),
+        )
+
+    raw_statements, ent_quote = get_fetch_loop().run(fetch)
+    return tuple(raw_statements), ent_quote
+
+
+def get_universe_inputs(companies, apiKey, max_concurrent=MAX_CONCURRENT_REQUESTS):
+    """Blocking get_universe_inputs_async, for one-off use with a whole list.
+
+    Runs on an event loop of its own with its own max_concurrent limit, so
+    call it once per batch rather than per ticker.
+    """
+    if max_concurrent > hg_fmplib.HTTP_POOL_SIZE:
+        hg_fmplib.configure_http(pool_size=max_concurrent)
+    return asyncio.run(get_universe_inputs_async(companies, apiKey, max_concurrent))
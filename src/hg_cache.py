@@ -0,0 +1,146 @@
+"""
+On-disk cache for Financial Modeling Prep responses.
+
+Responses are stored in a small SQLite database keyed by endpoint, symbol and
+the remaining query parameters (never the api key). Each endpoint has its own
+time-to-live: quarterly statements only change when a company files, so they
+are kept for days, while price and share counts are refreshed more often.
+
+"""
+
+import json
+import sqlite3
+import threading
+import time
+
+DAY = 24 * 60 * 60
+
+# File name of the cache, kept in hg_fmplib.DATA_DIR with the other data files
+CACHE_FILE = "fmp_cache.db"
+
+# Seconds a cached response stays fresh, per endpoint.
+CACHE_TTL = {
+    "income-statement": 7 * DAY,
+    "balance-sheet-statement": 7 * DAY,
+    "cash-flow-statement": 7 * DAY,
+    "profile": 60 * 60,
+    "batch-quote": 60 * 60,
+    "shares-float": DAY,
+    "historical-price-eod/light": DAY,
+}
+DEFAULT_TTL = 60 * 60
+
+
+def default_path():
+    """CACHE_FILE in hg_fmplib.DATA_DIR.
+
+    Imported here rather than at the top because hg_fmplib imports this module.
+    """
+    import hg_fmplib
+
+    return f"{hg_fmplib.DATA_DIR}/{CACHE_FILE}"
+
+
+def cache_key(endpoint, symbol, params=None):
+    """Build the cache key for an endpoint+symbol+params request."""
+    params = params or {}
+    query = "&".join(
+        f"{k}={params[k]}" for k in sorted(params) if k.lower() != "apikey"
+    )
+    return f"{endpoint}|{symbol}|{query}"
+
+
+class ResponseCache:
+    """SQLite backed response cache shared by every thread in the process.
+
+    The connection is opened on first use so importing the module does no I/O;
+    without a path the file is default_path().
+    WAL journaling lets several processes on the host read and write the same
+    cache file at once.
+    """
+
+    def __init__(self, path=None, ttl=None, enabled=True):
+        self.path = path
+        self.ttl = dict(CACHE_TTL if ttl is None else ttl)
+        self.enabled = enabled
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._conn is None:
+            if self.path is None:
+                self.path = default_path()
+            self._conn = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """CREATE TABLE IF NOT EXISTS response_cache (
+                      key TEXT PRIMARY KEY,
+                      endpoint TEXT NOT NULL,
+                      fetched_at REAL NOT NULL,
+                      body TEXT NOT NULL
+                      )"""
+            )
+        return self._conn
+
+    def get(self, endpoint, symbol, params=None):
+        """Return the cached payload or None if missing or expired."""
+        if not self.enabled:
+            return None
+        key = cache_key(endpoint, symbol, params)
+        with self._lock:
+            row = (
+                self._connect()
+                .execute(
+                    "SELECT fetched_at, body FROM response_cache WHERE key = ?",
+                    (key,),
+                )
+                .fetchone()
+            )
+        if row is None:
+            return None
+        fetched_at, body = row
+        if time.time() - fetched_at > self.ttl.get(endpoint, DEFAULT_TTL):
+            return None
+        return json.loads(body)
+
+    def put(self, endpoint, symbol, params, data):
+        if not self.enabled:
+            return
+        key = cache_key(endpoint, symbol, params)
+        with self._lock:
+            self._connect().execute(
+                "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?)",
+                (key, endpoint, time.time(), json.dumps(data)),
+            )
+
+    def purge_expired(self):
+        """Delete every entry older than its endpoint's TTL."""
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            for endpoint in conn.execute(
+                "SELECT DISTINCT endpoint FROM response_cache"
+            ).fetchall():
+                endpoint = endpoint[0]
+                conn.execute(
+                    "DELETE FROM response_cache WHERE endpoint = ? AND fetched_at < ?",
+                    (endpoint, now - self.ttl.get(endpoint, DEFAULT_TTL)),
+                )
+
+    def clear(self):
+        with self._lock:
+            self._connect().execute("DELETE FROM response_cache")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+CACHE = ResponseCache()
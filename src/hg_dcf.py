@@ -0,0 +1,348 @@
+"""
+Vectorized FCFF discounted cash flow kernel.
+
+The functions here are pure: every input is a scalar or a NumPy array and
+the arrays broadcast against each other, so one call values N tickers or N
+scenarios of the same ticker. Nothing is read from module globals.
+
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+
+
+@dataclass
+class DCFResult:
+    fcff_value: np.ndarray
+    terminal_value: np.ndarray
+    intrinsic_value: np.ndarray
+
+
+def growth_pv_factor(growth_rate, discount_rate, growth_period):
+    """Sum of ((1 + g) / (1 + r)) ** t for t = 1..n in closed form.
+
+    Multiplying by the current year's FCFF gives the present value of the
+    growth period cash flows. When g == r the geometric series degenerates to
+    n.
+    """
+    g = np.asarray(growth_rate, dtype=float)
+    r = np.asarray(discount_rate, dtype=float)
+    n = np.asarray(growth_period, dtype=float)
+    q = (1 + g) / (1 + r)
+    flat = np.isclose(q, 1.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        series = q * (1 - q**n) / (1 - q)
+    return np.where(flat, n, series)
+
+
+def dcf_kernel(
+    adjusted_ebiat,
+    growth_rate,
+    reinvestment_rate,
+    discount_rate,
+    stable_cost_of_capital,
+    growth_period,
+    risk_free,
+    cash_and_equivalents=0.0,
+    bv_debt=0.0,
+    shares_outstanding=1.0,
+):
+    """Value FCFF over the growth period plus a stable growth terminal value.
+
+    Mirrors calc_expected_fcff -> calc_fcff_value -> calc_terminal_value ->
+    calc_intrinsic_value in fmp_fcff:
+
+        fcff_t = adjusted_ebiat * (1 + g) ** t * (1 - reinvestment_rate)
+        terminal = fcff_n * (1 + risk_free) / (stable_cost - risk_free)
+
+    with the terminal value discounted at the growth period cost of capital.
+    All arguments broadcast; the result holds arrays of the broadcast shape.
+    With the default cash, debt and share count the intrinsic value is the
+    enterprise value.
+    """
+    adjusted_ebiat = np.asarray(adjusted_ebiat, dtype=float)
+    g = np.asarray(growth_rate, dtype=float)
+    r = np.asarray(discount_rate, dtype=float)
+    n = np.asarray(growth_period, dtype=float)
+    risk_free = np.asarray(risk_free, dtype=float)
+
+    base_fcff = adjusted_ebiat * (1 - np.asarray(reinvestment_rate, dtype=float))
+    fcff_value = base_fcff * growth_pv_factor(g, r, n)
+
+    fcff_last = base_fcff * (1 + g) ** n
+    terminal_value = (fcff_last * (1 + risk_free)) / (
+        np.asarray(stable_cost_of_capital, dtype=float) - risk_free
+    )
+    terminal_value_pv = terminal_value / (1 + r) ** n
+
+    enterprise_value = (
+        fcff_value
+        + terminal_value_pv
+        + np.asarray(cash_and_equivalents, dtype=float)
+        - np.asarray(bv_debt, dtype=float)
+    )
+    intrinsic_value = enterprise_value / np.asarray(shares_outstanding, dtype=float)
+
+    return DCFResult(fcff_value, terminal_value_pv, intrinsic_value)
+
+
+def stable_beta_kernel(beta):
+    """Vectorized fmp_fcff.calc_stable_beta."""
+    beta = np.asarray(beta, dtype=float)
+    return np.select([beta < 0.5, beta > 1.5], [0.8, 1.2], 1.0)
+
+
+def discount_rate_kernel(
+    risk_free, beta, eq_prem, default_spread, percent_debt, marginal_tax_rate
+):
+    """Vectorized cost of capital, as in fmp_fcff.calc_discount_rate."""
+    risk_free = np.asarray(risk_free, dtype=float)
+    percent_debt = np.asarray(percent_debt, dtype=float)
+    cost_of_equity = risk_free + np.asarray(beta, dtype=float) * eq_prem
+    cost_of_debt = (risk_free + default_spread) * (1 - marginal_tax_rate)
+    return cost_of_debt * percent_debt + cost_of_equity * (1 - percent_debt)
+
+
+# ## Reverse DCF
+
+# Search interval per solvable input. Intrinsic value rises with the growth
+# rate and falls with the reinvestment rate and the cost of capital, so each
+# has at most one root in its interval.
+IMPLIED_BOUNDS = {
+    "growth_rate": (-0.5, 1.0),
+    "reinvestment_rate": (-2.0, 1.0),
+    "discount_rate": (0.0, 1.0),
+}
+
+
+def implied_rate(
+    price, inputs, solve_for="growth_rate", bounds=None, tol=1e-9, max_iter=100
+):
+    """Solve dcf_kernel(**inputs).intrinsic_value == price for one input.
+
+    inputs are dcf_kernel's keyword arguments without solve_for; price and
+    the inputs broadcast, so one call solves a whole universe. The root is
+    found by bisection on every element at once. Elements where the price
+    isn't reachable within bounds (default IMPLIED_BOUNDS[solve_for]) are NaN.
+    """
+    low, high = bounds or IMPLIED_BOUNDS[solve_for]
+    price = np.asarray(price, dtype=float)
+    shape = np.broadcast_shapes(price.shape, *(np.shape(v) for v in inputs.values()))
+    low = np.full(shape, low, dtype=float)
+    high = np.full(shape, high, dtype=float)
+
+    def excess(x):
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            return dcf_kernel(**inputs, **{solve_for: x}).intrinsic_value - price
+
+    f_low, f_high = excess(low), excess(high)
+    bracketed = np.isfinite(f_low) & np.isfinite(f_high) & (f_low * f_high <= 0)
+    for _ in range(max_iter):
+        mid = (low + high) / 2
+        f_mid = excess(mid)
+        same_side = np.sign(f_mid) == np.sign(f_low)
+        low = np.where(same_side, mid, low)
+        f_low = np.where(same_side, f_mid, f_low)
+        high = np.where(same_side, high, mid)
+        if np.all(high - low < tol):
+            break
+    return np.where(bracketed, (low + high) / 2, np.nan)
+
+
+# ## Sensitivity grid
+
+
+def discount_factor_table(discount_rates, max_period):
+    """(1 + r) ** -t for every rate and t = 1..max_period: a rates x periods array."""
+    r = np.asarray(discount_rates, dtype=float)
+    t = np.arange(1, max_period + 1)
+    return (1 + r[:, None]) ** -t
+
+
+@dataclass
+class SensitivityGrid:
+    """Intrinsic value over growth period x cost of capital x growth x stable cost.
+
+    intrinsic_value has one leading axis per ticker when the grid was run for
+    a batch, then the four axes in the order of the fields above it.
+    """
+
+    growth_periods: np.ndarray
+    discount_rates: np.ndarray
+    growth_rates: np.ndarray
+    stable_costs: np.ndarray
+    intrinsic_value: np.ndarray
+
+
+def sensitivity_grid(
+    adjusted_ebiat,
+    reinvestment_rate,
+    growth_periods,
+    discount_rates,
+    growth_rates,
+    stable_costs,
+    risk_free,
+    cash_and_equivalents=0.0,
+    bv_debt=0.0,
+    shares_outstanding=1.0,
+):
+    """Evaluate dcf_kernel over the full grid of the four rate axes at once.
+
+    The discount factors (1 + r) ** -t and growth factors (1 + g) ** t are
+    tabulated once up to the longest growth period, and their running sum
+    gives the present value of the growth period FCFF for every (r, g, n).
+    Each cell is then the value of one unit of base FCFF,
+
+        sum_{t<=n} ((1 + g) / (1 + r)) ** t
+            + (1 + g) ** n (1 + r) ** -n (1 + rf) / (stable - rf)
+
+    which doesn't depend on the ticker. The per ticker inputs (arrays for a
+    batch) only scale and shift that table. Cells with a stable cost of
+    capital at or below the risk free rate are NaN.
+    """
+    periods = np.asarray(growth_periods, dtype=int)
+    r = np.asarray(discount_rates, dtype=float)
+    g = np.asarray(growth_rates, dtype=float)
+    stable = np.asarray(stable_costs, dtype=float)
+    max_period = int(periods.max())
+
+    discount = discount_factor_table(r, max_period)  # r x t
+    growth = (1 + g[:, None]) ** np.arange(1, max_period + 1)  # g x t
+    flows = np.cumsum(discount[:, None, :] * growth[None, :, :], axis=2)  # r x g x t
+
+    idx = periods - 1
+    pv_growth = flows[:, :, idx].transpose(2, 0, 1)  # n x r x g
+    end_value = (discount[:, None, idx] * growth[None, :, idx]).transpose(2, 0, 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terminal_multiple = np.where(
+            stable > risk_free, (1 + risk_free) / (stable - risk_free), np.nan
+        )
+    unit_value = (
+        pv_growth[..., None] + end_value[..., None] * terminal_multiple
+    )  # n x r x g x s
+
+    base_fcff = np.asarray(adjusted_ebiat, dtype=float) * (
+        1 - np.asarray(reinvestment_rate, dtype=float)
+    )
+    batch = (...,) + (None,) * unit_value.ndim
+    intrinsic_value = (
+        base_fcff[batch] * unit_value
+        + np.asarray(cash_and_equivalents, dtype=float)[batch]
+        - np.asarray(bv_debt, dtype=float)[batch]
+    ) / np.asarray(shares_outstanding, dtype=float)[batch]
+    return SensitivityGrid(periods, r, g, stable, intrinsic_value)
+
+
+# ## Monte Carlo
+
+
+@dataclass
+class MonteCarloSpec:
+    """Sampling distributions for the uncertain drivers of the FCFF model.
+
+    Rates are drawn from normal distributions centred on the point estimate
+    with the standard deviations below; the growth period is drawn uniformly
+    from growth_period_range (inclusive), or from the point estimate +/- 2
+    years when the range is None.
+    """
+
+    draws: int = 100_000
+    reinvestment_rate_sd: float = 0.10
+    return_on_capital_sd: float = 0.03
+    eq_prem_sd: float = 0.005
+    risk_free_sd: float = 0.005
+    beta_sd: float = 0.15
+    growth_period_range: tuple | None = None
+    percentiles: tuple = (5, 25, 50, 75, 95)
+    seed: int | None = None
+
+
+@dataclass
+class MonteCarloResult:
+    draws: int
+    mean: float
+    percentiles: dict
+    prob_margin_of_safety: float
+    intrinsic_value: np.ndarray
+
+
+def monte_carlo(
+    adjusted_ebiat,
+    reinvestment_rate,
+    return_on_capital,
+    beta,
+    eq_prem,
+    risk_free,
+    default_spread,
+    percent_debt,
+    marginal_tax_rate,
+    growth_period,
+    cash_and_equivalents,
+    bv_debt,
+    shares_outstanding,
+    price,
+    spec=None,
+):
+    """Simulate the intrinsic value of one ticker.
+
+    Reinvestment rate, ROIC, ERP, risk free rate, beta and growth period are
+    sampled per draw and pushed through growth rate -> cost of capital ->
+    stable cost of capital -> dcf_kernel as whole arrays. Draws with a
+    non-finite value (e.g. a stable cost of capital at the risk free rate) are
+    dropped before the statistics are taken.
+
+    prob_margin_of_safety is the share of draws where the intrinsic value is
+    above the price, i.e. margin_of_safety_pc > 0.
+    """
+    spec = spec or MonteCarloSpec()
+    rng = np.random.default_rng(spec.seed)
+    size = spec.draws
+
+    reinvestment = rng.normal(reinvestment_rate, spec.reinvestment_rate_sd, size)
+    roic = rng.normal(return_on_capital, spec.return_on_capital_sd, size)
+    erp = np.maximum(rng.normal(eq_prem, spec.eq_prem_sd, size), 0.0)
+    rf = np.maximum(rng.normal(risk_free, spec.risk_free_sd, size), 0.0)
+    betas = np.maximum(rng.normal(beta, spec.beta_sd, size), 0.0)
+    low, high = spec.growth_period_range or (
+        max(1, growth_period - 2),
+        growth_period + 2,
+    )
+    periods = rng.integers(low, high + 1, size)
+
+    growth_rate = reinvestment * roic
+    discount_rate = discount_rate_kernel(
+        rf, betas, erp, default_spread, percent_debt, marginal_tax_rate
+    )
+    stable_cost_of_capital = discount_rate_kernel(
+        rf,
+        stable_beta_kernel(betas),
+        erp,
+        default_spread,
+        percent_debt,
+        marginal_tax_rate,
+    )
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        value = dcf_kernel(
+            adjusted_ebiat,
+            growth_rate,
+            reinvestment,
+            discount_rate,
+            stable_cost_of_capital,
+            periods,
+            rf,
+            cash_and_equivalents,
+            bv_debt,
+            shares_outstanding,
+        ).intrinsic_value
+    value = value[np.isfinite(value)]
+
+    if value.size == 0:
+        raise ValueError("No Monte Carlo draw produced a finite value")
+    return MonteCarloResult(
+        value.size,
+        float(value.mean()),
+        dict(zip(spec.percentiles, np.percentile(value, spec.percentiles).tolist())),
+        float(np.mean(value > price)),
+        value,
+    )
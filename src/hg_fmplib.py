@@ -3,33 +3,30 @@ This library is a collection of functions used in the Hess Group DCF model.
 
 """
 
+import bisect
+import fcntl
 import json
-from urllib.request import urlopen
-import pandas as pd
+import os
+import pickle
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from datetime import date
+import numpy as np
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import re
+import hg_cache
+import hg_profile
+from hg_statement import Statement
+
+# pandas and BeautifulSoup are imported inside the functions that read the
+# spreadsheets and the Damodaran page, so importing this module stays cheap.
 
 import logging
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)  # Set the overall logger level
-
-formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-
-# Create a stream handler for the console
-stream_handler = logging.StreamHandler()
-stream_handler.setLevel(logging.WARNING)  # only show INFO and above on console
-stream_handler.setFormatter(formatter)
-
-# Create a FileHandler for the log file
-file_handler = logging.FileHandler("data/value.log")
-file_handler.setLevel(logging.DEBUG)  # log all messages to the file
-file_handler.setFormatter(formatter)
-
-# Add the handlers to the logger
-logger.addHandler(stream_handler)
-logger.addHandler(file_handler)
 
 
 def safe_float(val):
@@ -39,13 +36,207 @@ def safe_float(val):
         return 0.0
 
 
+# Set FMP_DATA_DIR to read the reference spreadsheets from another directory.
+DATA_DIR = os.environ.get("FMP_DATA_DIR", "/Users/jhess/Development/FMP/data")
+
+
+# Shared HTTP client: one pooled keep-alive session with timeouts and retries
+
+HTTP_TIMEOUT = (5, 30)  # (connect, read) seconds
+HTTP_RETRIES = 5
+HTTP_BACKOFF = 0.5  # seconds, doubled on every retry
+HTTP_BACKOFF_JITTER = 0.5  # seconds of random jitter added to each backoff
+HTTP_POOL_SIZE = 32
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def make_session(
+    pool_size=HTTP_POOL_SIZE,
+    retries=HTTP_RETRIES,
+    backoff=HTTP_BACKOFF,
+    backoff_jitter=HTTP_BACKOFF_JITTER,
+):
+    """Build a requests.Session with a connection pool and retry policy.
+
+    Connection errors and 429/5xx responses are retried with exponential
+    backoff plus jitter; a Retry-After header from a 429 is honoured.
+    """
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        backoff_jitter=backoff_jitter,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=["GET"],
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def configure_http(**kwargs):
+    """Replace the shared session, e.g. configure_http(pool_size=64, retries=8).
+
+    Takes the keyword arguments of make_session. Call it before starting a
+    large batch so the pool is at least as big as the worker count.
+    """
+    global _session
+    with _session_lock:
+        old, _session = _session, make_session(**kwargs)
+    if old is not None:
+        old.close()
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = make_session()
+    return _session
+
+
+def http_get(url, params=None, timeout=None):
+    """GET through the shared session; raises for a final 4xx/5xx status."""
+    response = get_session().get(url, params=params, timeout=timeout or HTTP_TIMEOUT)
+    hg_profile.add_bytes(len(response.content))
+    response.raise_for_status()
+    return response
+
+
 # Read statements from Financial Modeling Prep
 
+# Set FMP_BASE_URL to point the library at a stand-in server.
+FMP_BASE_URL = os.environ.get(
+    "FMP_BASE_URL", "https://financialmodelingprep.com/stable"
+)
+QUOTE_BATCH_SIZE = 100
+
 
 def get_jsonparsed_data(url):
-    response = urlopen(url)
-    data = response.read().decode("utf-8")
-    return json.loads(data)
+    return http_get(url).json()
+
+
+def fetch_fmp(endpoint, company, apiKey, **params):
+    """Return the parsed JSON for an FMP endpoint, using the on-disk cache.
+
+    Responses are cached by endpoint, symbol and params with the TTL set for
+    the endpoint in hg_cache.CACHE_TTL. Only non-empty lists are cached, so a
+    transient miss or an error object doesn't stick.
+    """
+    with hg_profile.span(f"fetch:{endpoint}", company):
+        data = hg_cache.CACHE.get(endpoint, company, params)
+        if data is not None:
+            logger.debug("Cache hit %s %s", endpoint, company)
+            hg_profile.count("cache_hit", company)
+            return data
+
+        hg_profile.count("cache_miss", company)
+        resp = http_get(
+            f"{FMP_BASE_URL}/{endpoint}",
+            params={"symbol": company, **params, "apikey": apiKey},
+        )
+        data = resp.json()
+        if isinstance(data, list) and data:
+            hg_cache.CACHE.put(endpoint, company, params, data)
+        return data
+
+
+def fetch_fmp_batch(endpoint, companies, apiKey, chunk_size=QUOTE_BATCH_SIZE, **params):
+    """Fetch a multi-symbol FMP endpoint and split the rows back per ticker.
+
+    The symbols go out comma separated in the `symbols` parameter,
+    chunk_size at a time. Cached symbols are served from the cache and only
+    the misses are requested. Returns a dict of ticker -> list of records;
+    a ticker the API returned nothing for maps to an empty list.
+    """
+    results = {}
+    missing = []
+    for company in companies:
+        data = hg_cache.CACHE.get(endpoint, company, params)
+        if data is not None:
+            hg_profile.count("cache_hit", company)
+            results[company] = data
+        else:
+            hg_profile.count("cache_miss", company)
+            missing.append(company)
+
+    for i in range(0, len(missing), chunk_size):
+        chunk = missing[i : i + chunk_size]
+        with hg_profile.span(f"fetch:{endpoint}"):
+            resp = http_get(
+                f"{FMP_BASE_URL}/{endpoint}",
+                params={"symbols": ",".join(chunk), **params, "apikey": apiKey},
+            )
+        by_symbol = {company: [] for company in chunk}
+        for record in resp.json() or []:
+            by_symbol.setdefault(record.get("symbol"), []).append(record)
+        for company in chunk:
+            if by_symbol[company]:
+                hg_cache.CACHE.put(endpoint, company, params, by_symbol[company])
+            results[company] = by_symbol[company]
+
+    return results
+
+
+# Statement fields kept from each FMP payload, and the keys they are
+# reported under by the parse_* functions.
+
+STATEMENT_YEARS = 5
+
+INCOME_KEYS = {
+    "ebit": "ebit",
+    "incomeBeforeTax": "incomeBeforeTax",
+    "incomeTaxExpense": "income_tax_expense",
+    "interestExpense": "interest_expense",
+}
+INCOME_FIELDS = (
+    *INCOME_KEYS,
+    "researchAndDevelopmentExpenses",
+    "weightedAverageShsOutDil",
+)
+
+BALANCE_KEYS = {
+    "cashAndShortTermInvestments": "cash_and_equivalents",
+    "totalCurrentAssets": "total_current_assets",
+    "shortTermDebt": "short_term_debt",
+    "capitalLeaseObligationsCurrent": "capitalLeaseObligationsCurrent",
+    "longTermDebt": "long_term_debt",
+    "capitalLeaseObligationsNonCurrent": "capitalLeaseObligationsNonCurrent",
+    "totalCurrentLiabilities": "total_current_liabilities",
+    "totalStockholdersEquity": "total_stockholders_equity",
+}
+BALANCE_FIELDS = tuple(BALANCE_KEYS)
+
+CASH_FLOW_KEYS = {
+    "capitalExpenditure": "capex",
+    "depreciationAndAmortization": "depreciation",
+}
+CASH_FLOW_FIELDS = tuple(CASH_FLOW_KEYS)
+
+# Endpoints of the income statement, balance sheet and cash flow, in that order
+STATEMENT_ENDPOINTS = (
+    "income-statement",
+    "balance-sheet-statement",
+    "cash-flow-statement",
+)
+
+
+def as_statement(data, fields):
+    """Return data as a Statement, converting a raw FMP payload if needed."""
+    if isinstance(data, Statement):
+        return data
+    if data is not None and not isinstance(data, list):
+        return Statement.from_records([], fields)
+    return Statement.from_records(data, fields)
 
 
 # Function to get the income statement and extract the required fields
@@ -57,130 +248,41 @@ def get_inc_stmnt(company: str, myApiKey: str) -> dict:
 
     The API returns up to 20 recent quarters; we aggregate them into at most five years.
     """
-    url = f"https://financialmodelingprep.com/stable/income-statement?symbol={company}&period=quarter&limit=20&apikey={myApiKey}"
-    resp = requests.get(url)
-    data = resp.json()
+    data = fetch_fmp("income-statement", company, myApiKey, period="quarter", limit=20)
+    return parse_inc_stmnt(company, data)
 
-    # The API returns the most recent quarter first.
 
-    if not data or not isinstance(data, list):
+def parse_inc_stmnt(company: str, data) -> dict:
+    """Annualize a quarterly income statement payload or Statement."""
+    income = as_statement(data, INCOME_FIELDS)
+
+    if not len(income):
         raise ValueError(f"No quarterly reports found for {company}. Response: {data}")
 
     # We’ll aggregate at most 5 years (20 quarters).
-    max_quarters = min(len(data), 20)
-    yearly_data = []
-
-    for i in range(0, max_quarters, 4):  # step by four quarters
-        quarter_block = data[i : i + 4]
-        if len(quarter_block) < 4:
-            break  # incomplete year at the end of the list
-
-        ebit = sum(safe_float(q["ebit"]) for q in quarter_block)
-        incomeBeforeTax = sum(safe_float(q["incomeBeforeTax"]) for q in quarter_block)
-        tax_exp = sum(safe_float(q["incomeTaxExpense"]) for q in quarter_block)
-        int_exp = sum(safe_float(q["interestExpense"]) for q in quarter_block)
-
-        yearly_data.append(
-            {
-                "ebit": ebit,
-                "incomeBeforeTax": incomeBeforeTax,
-                "income_tax_expense": tax_exp,
-                "interest_expense": int_exp,
-            }
-        )
-
-    # Build the result dictionary with separate lists
-    income_statement = {
-        "ebit": [y["ebit"] for y in yearly_data],
-        "incomeBeforeTax": [y["incomeBeforeTax"] for y in yearly_data],
-        "income_tax_expense": [y["income_tax_expense"] for y in yearly_data],
-        "interest_expense": [y["interest_expense"] for y in yearly_data],
-    }
-
-    return income_statement
+    yearly = income.annual_sums(INCOME_KEYS, STATEMENT_YEARS)
+    return {key: yearly[:, i].tolist() for i, key in enumerate(INCOME_KEYS.values())}
 
 
 # Function to get the balance sheet and extract the required fields
 
 
 def get_bal_sheet(company: str, myApiKey: str) -> dict:
-    url = f"https://financialmodelingprep.com/stable/balance-sheet-statement?symbol={company}&period=quarter&limit=20&apikey={myApiKey}"
+    data = fetch_fmp(
+        "balance-sheet-statement", company, myApiKey, period="quarter", limit=20
+    )
+    return parse_bal_sheet(company, data)
 
-    data = get_jsonparsed_data(url)
 
-    if not data or not isinstance(data, list):
-        raise ValueError(f"No balance sheet data found for {company}. Response: {data}")
+def parse_bal_sheet(company: str, data) -> dict:
+    """Pull the year-end balances out of a quarterly balance sheet payload."""
+    balance = as_statement(data, BALANCE_FIELDS)
 
-    balSht = {}
-    cashAndEquivalents = [
-        safe_float(data[0]["cashAndShortTermInvestments"]),
-        safe_float(data[4]["cashAndShortTermInvestments"]),
-        safe_float(data[8]["cashAndShortTermInvestments"]),
-        safe_float(data[12]["cashAndShortTermInvestments"]),
-        safe_float(data[16]["cashAndShortTermInvestments"]),
-    ]
-    currentAssets = [
-        safe_float(data[0]["totalCurrentAssets"]),
-        safe_float(data[4]["totalCurrentAssets"]),
-        safe_float(data[8]["totalCurrentAssets"]),
-        safe_float(data[12]["totalCurrentAssets"]),
-        safe_float(data[16]["totalCurrentAssets"]),
-    ]
+    if not len(balance):
+        raise ValueError(f"No balance sheet data found for {company}. Response: {data}")
 
-    stockholdersEquity = [
-        safe_float(data[0]["totalStockholdersEquity"]),
-        safe_float(data[4]["totalStockholdersEquity"]),
-        safe_float(data[8]["totalStockholdersEquity"]),
-        safe_float(data[12]["totalStockholdersEquity"]),
-        safe_float(data[16]["totalStockholdersEquity"]),
-    ]
-    currentLiabilities = [
-        safe_float(data[0]["totalCurrentLiabilities"]),
-        safe_float(data[4]["totalCurrentLiabilities"]),
-        safe_float(data[8]["totalCurrentLiabilities"]),
-        safe_float(data[12]["totalCurrentLiabilities"]),
-        safe_float(data[16]["totalCurrentLiabilities"]),
-    ]
-    shortTermDebt = [
-        safe_float(data[0]["shortTermDebt"]),
-        safe_float(data[4]["shortTermDebt"]),
-        safe_float(data[8]["shortTermDebt"]),
-        safe_float(data[12]["shortTermDebt"]),
-        safe_float(data[16]["shortTermDebt"]),
-    ]
-    currentLeaseObligations = [
-        safe_float(data[0]["capitalLeaseObligationsCurrent"]),
-        safe_float(data[4]["capitalLeaseObligationsCurrent"]),
-        safe_float(data[8]["capitalLeaseObligationsCurrent"]),
-        safe_float(data[12]["capitalLeaseObligationsCurrent"]),
-        safe_float(data[16]["capitalLeaseObligationsCurrent"]),
-    ]
-    longTermDebt = [
-        safe_float(data[0]["longTermDebt"]),
-        safe_float(data[4]["longTermDebt"]),
-        safe_float(data[8]["longTermDebt"]),
-        safe_float(data[12]["longTermDebt"]),
-        safe_float(data[16]["longTermDebt"]),
-    ]
-    longTermLeaseObligations = [
-        safe_float(data[0]["capitalLeaseObligationsNonCurrent"]),
-        safe_float(data[4]["capitalLeaseObligationsNonCurrent"]),
-        safe_float(data[8]["capitalLeaseObligationsNonCurrent"]),
-        safe_float(data[12]["capitalLeaseObligationsNonCurrent"]),
-        safe_float(data[16]["capitalLeaseObligationsNonCurrent"]),
-    ]
-    balSht["cash_and_equivalents"] = cashAndEquivalents
-    balSht["total_current_assets"] = currentAssets
-    # balSht["totalAssets"] = totalAssets
-    # balSht["accountsPayable"] = accountsPayable
-    balSht["short_term_debt"] = shortTermDebt
-    balSht["capitalLeaseObligationsCurrent"] = currentLeaseObligations
-    balSht["long_term_debt"] = longTermDebt
-    balSht["capitalLeaseObligationsNonCurrent"] = longTermLeaseObligations
-    balSht["total_current_liabilities"] = currentLiabilities
-    # balSht["totalLiabilities"] = liabilities
-    balSht["total_stockholders_equity"] = stockholdersEquity
-    return balSht
+    year_end = balance.year_end(BALANCE_KEYS, STATEMENT_YEARS)
+    return {key: year_end[:, i].tolist() for i, key in enumerate(BALANCE_KEYS.values())}
 
 
 # Function to get the cash flow statement and extract the required fields
@@ -202,50 +304,116 @@ def get_cash_flow(company: str, apiKey: str) -> dict:
     dict
         Keys: 'depreciation', 'capex' (each a list of up to 5 yearly values).
     """
-    url = f"https://financialmodelingprep.com/stable/cash-flow-statement?symbol={company}&period=quarter&limit=20&apikey={apiKey}"
-    resp = requests.get(url)
-    data = resp.json()
+    data = fetch_fmp("cash-flow-statement", company, apiKey, period="quarter", limit=20)
+    return parse_cash_flow(company, data)
+
+
+def parse_cash_flow(company: str, data) -> dict:
+    """Annualize a quarterly cash-flow payload or Statement."""
+    cash_flow = as_statement(data, CASH_FLOW_FIELDS)
 
-    if not data:
+    if not len(cash_flow):
         raise ValueError(f"No quarterly cash‑flow reports found for {company}")
 
     # We’ll aggregate at most 5 years (20 quarters).
-    max_quarters = min(len(data), 20)
+    yearly = cash_flow.annual_sums(CASH_FLOW_KEYS, STATEMENT_YEARS)
+    return {
+        key: yearly[:, i].tolist()  # keep the key names you used before
+        for i, key in enumerate(CASH_FLOW_KEYS.values())
+    }
 
-    depreciation = []
-    capex = []
 
-    # Step through the list in blocks of four quarters.
-    for i in range(0, max_quarters, 4):
-        block = data[i : i + 4]
-        if len(block) < 4:
-            break  # incomplete year at the end
+# Fetch every statement for a ticker once and share the payloads
 
-        yearly_capex = sum(safe_float(q["capitalExpenditure"]) for q in block)
-        yearly_depr = sum(safe_float(q["depreciationAndAmortization"]) for q in block)
 
-        capex.append(yearly_capex)
-        depreciation.append(yearly_depr)
+@dataclass
+class StatementBundle:
+    """The quarterly statements of one ticker, fetched once.
 
-    return {
-        "capex": capex,  # keep the key names you used before
-        "depreciation": depreciation,
-    }
+    Each statement is held as a columnar hg_statement.Statement with only the
+    fields the model uses. The income statement feeds both the
+    EBIT/tax/interest view and the R&D view, so a valuation costs one request
+    per statement.
+    """
+
+    company: str
+    income: Statement
+    balance: Statement
+    cash_flow: Statement
+
+    def inc_stmnt(self) -> dict:
+        return parse_inc_stmnt(self.company, self.income)
+
+    def bal_sheet(self) -> dict:
+        return parse_bal_sheet(self.company, self.balance)
+
+    def cash_flow_stmnt(self) -> dict:
+        return parse_cash_flow(self.company, self.cash_flow)
+
+    def rAndD(self, rd_years):
+        return parse_rAndD(self.income, rd_years)
+
+    def as_of(self, as_of_date):
+        """The statements as they stood on as_of_date, by filing date."""
+        return StatementBundle(
+            self.company,
+            self.income.as_of(as_of_date),
+            self.balance.as_of(as_of_date),
+            self.cash_flow.as_of(as_of_date),
+        )
+
+
+@hg_profile.timed(ticker_arg=0)
+def bundle_statements(company, income, balance, cash_flow):
+    """Parse the three raw statement payloads of a ticker into a StatementBundle."""
+    return StatementBundle(
+        company,
+        as_statement(income, INCOME_FIELDS),
+        as_statement(balance, BALANCE_FIELDS),
+        as_statement(cash_flow, CASH_FLOW_FIELDS),
+    )
+
+
+@hg_profile.timed(ticker_arg=0)
+def get_statements(company: str, apiKey: str, limit=20) -> StatementBundle:
+    """Fetch the income statement, balance sheet and cash flow of a ticker.
+
+    limit is the number of quarters; a backfill asks for a longer history.
+    """
+    return bundle_statements(
+        company,
+        *(
+            fetch_fmp(endpoint, company, apiKey, period="quarter", limit=limit)
+            for endpoint in STATEMENT_ENDPOINTS
+        ),
+    )
 
 
 # function to retrieve R&D expense so we can capitalize it
 
 
-def get_erp():
-    # URL of the page
-    url = "https://pages.stern.nyu.edu/~adamodar/New_Home_Page/home.htm"  # Replace with the correct full URL if deeper than homepage
+# Set ERP_URL to read the implied ERP from a stand-in server.
+ERP_URL = os.environ.get(
+    "ERP_URL", "https://pages.stern.nyu.edu/~adamodar/New_Home_Page/home.htm"
+)
 
-    # Fetch the page
-    response = requests.get(url)
-    response.raise_for_status()  # Raises an error if the request failed
+# The first percentage after "Implied ERP", skipping any tags in between.
+ERP_PATTERN = re.compile(r"Implied ERP[^%]{0,300}?(\d+\.\d+)%")
+
+
+def extract_erp(html):
+    """Pull the implied ERP straight out of the page text with one regex."""
+    match = ERP_PATTERN.search(html)
+    if match:
+        return safe_float(match.group(1)) / 100
+    return None
+
+
+def parse_erp_html(html):
+    """Fallback ERP extraction that parses the whole page with BeautifulSoup."""
+    from bs4 import BeautifulSoup
 
-    # Parse the HTML
-    soup = BeautifulSoup(response.text, "html.parser")
+    soup = BeautifulSoup(html, "html.parser")
 
     # Find the paragraph containing the ERP info
     paragraphs = soup.find_all("p")
@@ -259,13 +427,21 @@ def get_erp():
     # Use regex to extract the first percentage value
     match = re.search(r"(\d+\.\d+)%", text)
     if match:
-        implied_erp = safe_float(match.group(1)) / 100
-        # print(f"Implied ERP: {implied_erp}%")
-        logger.info(f"Implied ERP {implied_erp}")
-        return implied_erp
-    else:
-        # print("Couldn't extract Implied ERP value")
-        logger.debug("Couldn't extract ERP %s")
+        return safe_float(match.group(1)) / 100
+    # print("Couldn't extract Implied ERP value")
+    logger.debug("Couldn't extract ERP %s")
+
+
+@hg_profile.timed
+def get_erp():
+    # Fetch the page
+    response = http_get(ERP_URL)  # Raises an error if the request failed
+
+    implied_erp = extract_erp(response.text)
+    if implied_erp is None:
+        implied_erp = parse_erp_html(response.text)
+    logger.info("Implied ERP %s", implied_erp)
+    return implied_erp
 
 
 def get_rAndD(company, rd_years, apiKey):
@@ -278,53 +454,30 @@ def get_rAndD(company, rd_years, apiKey):
         apiKey (str): The Financial Modeling Prep API key.
 
     Returns:
-        dict: A dictionary containing a list of yearly R&D expenses.
+        tuple: A dictionary containing a list of yearly R&D expenses and the
+        number of years found.
     """
-    url = f"https://financialmodelingprep.com/stable/income-statement?symbol={company}&period=quarter&limit=20&apikey={apiKey}"
-
-    rd_table = {}
-    try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an exception for bad status codes
-        data = response.json()
-    except requests.exceptions.RequestException as e:
-        logger.debug(f"Error fetching data from Financial Modeling Prep: {e}")
-        return {"research_and_development": []}
-
-    rdExpense = data
+    data = fetch_fmp("income-statement", company, apiKey, period="quarter", limit=20)
+    return parse_rAndD(data, rd_years)
 
-    if not rdExpense:
-        logger.debug("No quarterly reports found.")
-        return {"research_and_development": []}
-
-    rd_Amount = []
-
-    # We need to process quarters in chunks of 4 for each year.
-    # The number of available years is the length of the list divided by 4.
-    num_available_years = len(rdExpense) // 4
-    years_to_process = min(rd_years, num_available_years)
 
-    for i in range(years_to_process):
-        start_index = i * 4
-        end_index = start_index + 4
+def parse_rAndD(data, rd_years):
+    """Sum yearly R&D expense out of a quarterly income statement.
 
-        # Get the slice of the list for the current year's quarters
-        quarters = rdExpense[start_index:end_index]
+    Takes the raw payload or a Statement and returns the same
+    (rd_table, years_to_process) pair as get_rAndD.
+    """
+    income = as_statement(data, INCOME_FIELDS)
 
-        # Calculate the sum of R&D expenses for the year
-        yearRDExpense = 0.0
-        for quarter in quarters:
-            try:
-                # Use .get() with a default value to prevent KeyError
-                rd_val = safe_float(quarter.get("researchAndDevelopmentExpenses", "0"))
-                yearRDExpense += rd_val
-            except ValueError:
-                # If safe_float fails, just add 0 and continue.
-                pass
+    if not len(income):
+        logger.debug("No quarterly reports found.")
+        return {"research_and_development": []}, 0
 
-        rd_Amount.append(yearRDExpense)
+    # One complete block of four quarters per year, up to rd_years
+    rd_Amount = income.annual_sums(["researchAndDevelopmentExpenses"], rd_years)
+    years_to_process = rd_Amount.shape[0]
 
-    rd_table["research_and_development"] = rd_Amount
+    rd_table = {"research_and_development": rd_Amount[:, 0].tolist()}
     rdTable = rd_table, years_to_process
     return rdTable
 
@@ -332,16 +485,15 @@ def get_rAndD(company, rd_years, apiKey):
 # Function to get the current share price, shares outstanding, and market cap
 
 
+@hg_profile.timed(ticker_arg=0)
 def get_quote(company, apiKey):
     # ADD exchange to this extract and add it to the database
-    url = f"https://financialmodelingprep.com/stable/profile?symbol={company}&apikey={apiKey}"
-    data = get_jsonparsed_data(url)
+    data = fetch_fmp("profile", company, apiKey)
     # print(data)
     price = safe_float(data[0]["price"])
     marketCap = safe_float(data[0]["marketCap"])
     company_name = data[0]["companyName"]
-    url = f"https://financialmodelingprep.com/stable/shares-float?symbol={company}&apikey={apiKey}"
-    data = get_jsonparsed_data(url)
+    data = fetch_fmp("shares-float", company, apiKey)
     # print(data)
     sharesOutstanding = safe_float(data[0]["outstandingShares"])
 
@@ -349,8 +501,96 @@ def get_quote(company, apiKey):
     return entQuote
 
 
+@hg_profile.timed
+def get_quotes(companies, apiKey, chunk_size=QUOTE_BATCH_SIZE, workers=8):
+    """Batched get_quote: returns ticker -> (price, shares, market cap, name).
+
+    Price, market cap and name come from the multi-symbol batch-quote endpoint,
+    chunk_size tickers per request. Shares outstanding only exist per symbol
+    (shares-float, cached for a day), so those requests run on a thread pool.
+    If the plan doesn't allow batch-quote, or a ticker is missing from its
+    answer, that ticker falls back to get_quote. Failed tickers are logged
+    and left out.
+    """
+    try:
+        batch = fetch_fmp_batch("batch-quote", companies, apiKey, chunk_size)
+    except requests.exceptions.HTTPError as e:
+        logger.warning("batch-quote unavailable, quoting one by one: %s", e)
+        batch = {}
+
+    quotes = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_complete_quote, company, batch.get(company), apiKey): company
+            for company in companies
+        }
+        for future in as_completed(futures):
+            company = futures[future]
+            try:
+                quotes[company] = future.result()
+            except (requests.exceptions.RequestException, LookupError) as e:
+                logger.warning("Quote failed for %s: %s", company, e)
+    return quotes
+
+
+def _complete_quote(company, batch_rows, apiKey):
+    if not batch_rows:
+        return get_quote(company, apiKey)
+    row = batch_rows[0]
+    shares = fetch_fmp("shares-float", company, apiKey)
+    return (
+        safe_float(row["price"]),
+        safe_float(shares[0]["outstandingShares"]),
+        safe_float(row["marketCap"]),
+        row["name"],
+    )
+
+
+# Set FRED_BASE_URL to point the library at a stand-in server.
+FRED_BASE_URL = os.environ.get("FRED_BASE_URL", "https://api.stlouisfed.org/fred")
+FRED_URL = f"{FRED_BASE_URL}/series/observations"
+
+
+@hg_profile.timed(ticker_arg=0)
+def get_price_history(company, apiKey, start, end):
+    """Daily closing prices between start and end (ISO dates).
+
+    Returns a list of (date, price) pairs sorted oldest first.
+    """
+    data = fetch_fmp(
+        "historical-price-eod/light", company, apiKey, **{"from": start, "to": end}
+    )
+    return sorted((row["date"], safe_float(row["price"])) for row in data or [])
+
+
+def price_as_of(history, as_of_date):
+    """Last (date, price) in a sorted history on or before as_of_date, or None."""
+    index = bisect.bisect_right(history, (as_of_date, float("inf"))) - 1
+    return history[index] if index >= 0 else None
+
+
+@hg_profile.timed
+def get_risk_free_history(FRED_KEY, start=None):
+    """Monthly GS10 observations as a sorted list of (date, rate) pairs."""
+    params = {
+        "series_id": "GS10",
+        "api_key": FRED_KEY,
+        "file_type": "json",
+        "sort_order": "asc",
+    }
+    if start:
+        params["observation_start"] = start
+    response = http_get(FRED_URL, params=params)
+    return [
+        (row["date"], safe_float(row["value"]) / 100)
+        for row in response.json()["observations"]
+        if row["value"] != "."
+    ]
+
+
+@hg_profile.timed
 def get_risk_free(FRED_KEY):
-    url = "https://api.stlouisfed.org/fred/series/observations"
+    url = FRED_URL
     params = {
         "series_id": "GS10",
         "api_key": FRED_KEY,
@@ -359,98 +599,306 @@ def get_risk_free(FRED_KEY):
         "limit": 1,
     }
     # Fetch data
-    response = requests.get(url, params=params)
-
-    if response.status_code != 200:
-        logger.debug(f"Error: Received status code {response.status_code}")
-        return None
+    response = http_get(url, params=params)
 
     # Parse JSON response
     data = response.json()
     RISK_FREE = safe_float(data["observations"][0]["value"]) / 100
-    logger.info(f"Risk Free Rate {RISK_FREE}")
+    logger.info("Risk Free Rate %s", RISK_FREE)
     return RISK_FREE
 
 
-def get_industry(company):
+# Market parameter snapshot shared by every run and worker on the host
+
+MARKET_SNAPSHOT = f"{DATA_DIR}/market_snapshot.json"
+
+
+@dataclass
+class MarketSnapshot:
+    as_of: str
+    eq_prem: float
+    risk_free: float
+
+
+def read_market_snapshot(path=MARKET_SNAPSHOT):
+    try:
+        with open(path) as f:
+            return MarketSnapshot(**json.load(f))
+    except (OSError, ValueError, TypeError):
+        return None
+
+
+@hg_profile.timed
+def get_market_snapshot(FRED_KEY, path=MARKET_SNAPSHOT, max_age_days=1):
+    """Return today's ERP and risk free rate, fetching them at most once a day.
+
+    The values are kept in a small JSON file with their as-of date. When the
+    file is older than max_age_days the first process to notice takes an
+    exclusive lock, fetches both values and rewrites the file; processes
+    waiting on the lock then find the fresh snapshot and skip the fetch.
+    """
+
+    def is_fresh(snapshot):
+        return (
+            snapshot is not None
+            and (date.today() - date.fromisoformat(snapshot.as_of)).days < max_age_days
+        )
+
+    snapshot = read_market_snapshot(path)
+    if is_fresh(snapshot):
+        return snapshot
+
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            snapshot = read_market_snapshot(path)
+            if is_fresh(snapshot):
+                return snapshot
+
+            snapshot = MarketSnapshot(
+                str(date.today()), get_erp(), get_risk_free(FRED_KEY)
+            )
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(asdict(snapshot), f)
+            os.replace(tmp_path, path)
+            logger.info("Market snapshot refreshed %s", snapshot)
+            return snapshot
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+# Ticker -> industry group index compiled from indname.xlsx
+
+INDUSTRY_XLSX = f"{DATA_DIR}/indname.xlsx"
+INDUSTRY_INDEX = f"{DATA_DIR}/indname.idx.pickle"
+
+_industry_index = None
+_industry_lock = threading.Lock()
+
+
+def build_industry_index(source=INDUSTRY_XLSX):
+    """Compile the "Global by Industry" sheet into a ticker -> industry dict.
+
+    Only the two columns we need are read. When a ticker is listed on more
+    than one exchange the first row wins.
+    """
+    import pandas as pd
+
     indName = pd.read_excel(
-        "/Users/jhess/Development/FMP/data/indname.xlsx",
+        source,
         sheet_name="Global by Industry",
-    )
+        usecols=["Exchange:Ticker", "Industry Group"],
+    ).dropna()
+
+    index = {}
+    for exchange_ticker, industry in zip(
+        indName["Exchange:Ticker"], indName["Industry Group"]
+    ):
+        _, _, ticker = str(exchange_ticker).partition(":")
+        if ticker:
+            index.setdefault(ticker, industry)
+    return index
+
+
+@hg_profile.timed
+def load_industry_index(source=None, index_path=None):
+    """Return the ticker -> industry index, rebuilding it if the sheet changed.
+
+    The compiled index is pickled next to the spreadsheet together with the
+    spreadsheet's mtime, so the Excel file is only parsed again after it has
+    been replaced. The paths default to INDUSTRY_XLSX and INDUSTRY_INDEX as
+    set at call time.
+    """
+    source = source or INDUSTRY_XLSX
+    index_path = index_path or INDUSTRY_INDEX
+    source_mtime = os.path.getmtime(source)
+    try:
+        with open(index_path, "rb") as f:
+            cached = pickle.load(f)
+        if cached["mtime"] == source_mtime:
+            return cached["index"]
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+        pass
+
+    logger.info("Rebuilding industry index from %s", source)
+    index = build_industry_index(source)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(
+            {"mtime": source_mtime, "index": index},
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+    os.replace(tmp_path, index_path)
+    return index
 
-    for index, row in indName.iterrows():
-        try:
-            if company == row["Exchange:Ticker"].split(":")[1]:
-                industry = row["Industry Group"]
-                logger.info(f"Industry Group {industry}")
-            else:
-                continue
-        except TypeError:
-            continue
-        except AttributeError:
-            continue
-        except Exception as e:
-            logger.debug(f"Error reading industry {e}")
+
+@hg_profile.timed(ticker_arg=0)
+def get_industry(company):
+    global _industry_index
+    if _industry_index is None:
+        with _industry_lock:
+            if _industry_index is None:
+                _industry_index = load_industry_index()
+
+    try:
+        industry = _industry_index[company]
+    except KeyError:
+        raise ValueError(f"No industry group found for {company}") from None
+    logger.debug("Industry Group %s", industry)
     return industry
 
 
-def get_beta(industry):
-    beta = pd.read_excel(
-        "/Users/jhess/Development/FMP/data/betas.xlsx",
-        sheet_name="Industry Averages",
-        skiprows=9,
-    )
+BETAS_XLSX = f"{DATA_DIR}/betas.xlsx"
+RD_AMORTIZATION_XLSX = f"{DATA_DIR}/RD_Amortization.xlsx"
+
+
+# Industry -> unlevered beta and R&D amortization years, from betas.xlsx and
+# RD_Amortization.xlsx
+
+_beta_table = None
+_amortization_table = None
+_industry_table_lock = threading.Lock()
+
+
+class IndustryTable:
+    """One value per industry name from a reference sheet, read once.
+
+    lookup() tries the industry as an exact key first; with substring set it
+    then falls back to the last name containing it, which is the row the old
+    scan over the sheet ended on.
+    """
+
+    def __init__(self, names, values):
+        self.values = {}
+        for name, value in zip(names, values):
+            if isinstance(name, str):
+                self.values[name] = value
+        self._names = list(self.values)
 
-    for index, row in beta.iterrows():
+    @classmethod
+    def betas_from_excel(cls, path=BETAS_XLSX):
+        import pandas as pd
+
+        beta = pd.read_excel(path, sheet_name="Industry Averages", skiprows=9)
+        return cls(beta["Industry Name"], beta["Unlevered beta corrected for cash"])
+
+    @classmethod
+    def amortization_from_excel(cls, path=RD_AMORTIZATION_XLSX):
+        import pandas as pd
+
+        amortYears = pd.read_excel(path, sheet_name="Amort Years")
+        return cls(amortYears["Industry"], amortYears["Years"])
+
+    def lookup(self, industry, substring=False):
         try:
-            if industry in row["Industry Name"]:
-                unleveredBeta = row["Unlevered beta corrected for cash"]
-            else:
-                continue
-        except TypeError:
-            continue
-
-    logger.info(f"Beta {unleveredBeta}")
+            return self.values[industry]
+        except KeyError:
+            pass
+        if substring:
+            matches = [name for name in self._names if industry in name]
+            if matches:
+                return self.values[matches[-1]]
+        raise ValueError(f"No reference row found for industry {industry}")
+
+
+@hg_profile.timed
+def get_beta_table():
+    """Return the process wide IndustryTable of unlevered betas."""
+    global _beta_table
+    if _beta_table is None:
+        with _industry_table_lock:
+            if _beta_table is None:
+                _beta_table = IndustryTable.betas_from_excel()
+    return _beta_table
+
+
+@hg_profile.timed
+def get_amortization_table():
+    """Return the process wide IndustryTable of R&D amortization years."""
+    global _amortization_table
+    if _amortization_table is None:
+        with _industry_table_lock:
+            if _amortization_table is None:
+                _amortization_table = IndustryTable.amortization_from_excel()
+    return _amortization_table
+
+
+@hg_profile.timed
+def get_beta(industry):
+    unleveredBeta = get_beta_table().lookup(industry, substring=True)
+    logger.debug("Beta %s", unleveredBeta)
     return unleveredBeta
 
 
-def get_default_spread(intCover):
-    defaultSpread = pd.read_excel(
-        "/Users/jhess/Development/FMP/data/defaultSpread.xlsx"
-    )
+# Interest coverage -> default spread table from defaultSpread.xlsx
 
-    # for col in defaultSpread.columns:
-    #     print(col)
+DEFAULT_SPREAD_XLSX = f"{DATA_DIR}/defaultSpread.xlsx"
 
-    for index in defaultSpread.index:
-        if (
-            intCover > defaultSpread["GT"][index]
-            and intCover < defaultSpread["LT"][index]
-        ):
-            return defaultSpread["Spread"][index]
-        else:
-            continue
-    # print(defa
-    # ultSpread)
-    # print(defaultSpread.index)
+_default_spread_table = None
+_default_spread_lock = threading.Lock()
 
 
-def get_rAndD_years(industry):
-    amortYears = pd.read_excel(
-        "/Users/jhess/Development/FMP/data/RD_Amortization.xlsx",
-        sheet_name="Amort Years",
-    )
+class DefaultSpreadTable:
+    """Sorted breakpoint table mapping interest coverage to a default spread.
 
-    for index, row in amortYears.iterrows():
-        try:
-            if industry == row["Industry"]:
-                rAndD_years = row["Years"]
-                logger.info(f"Years = {rAndD_years}")
-            else:
-                continue
-        except TypeError:
-            continue
-        except AttributeError:
-            continue
+    Each row of defaultSpread.xlsx covers coverage ratios from its GT bound up
+    to the next row's GT bound, so only the sorted lower bounds are kept and a
+    lookup is a bisect. Coverage below the first bound gets the first (worst)
+    spread and anything above the last bound gets the last.
+    """
 
+    def __init__(self, lower_bounds, spreads):
+        order = np.argsort(lower_bounds)
+        self.lower_bounds = np.asarray(lower_bounds, dtype=float)[order]
+        self.spreads = np.asarray(spreads, dtype=float)[order]
+        self._bounds = self.lower_bounds.tolist()
+        self._spreads = self.spreads.tolist()
+
+    @classmethod
+    def from_excel(cls, path=DEFAULT_SPREAD_XLSX):
+        import pandas as pd
+
+        defaultSpread = pd.read_excel(path, usecols=["GT", "Spread"])
+        return cls(defaultSpread["GT"], defaultSpread["Spread"])
+
+    def spread(self, int_cover):
+        """Default spread for a single interest coverage ratio."""
+        index = bisect.bisect_right(self._bounds, int_cover) - 1
+        return self._spreads[max(index, 0)]
+
+    def spreads_for(self, int_covers):
+        """Default spreads for an array of interest coverage ratios."""
+        index = np.searchsorted(
+            self.lower_bounds, np.asarray(int_covers, dtype=float), side="right"
+        )
+        return self.spreads[np.clip(index - 1, 0, len(self.spreads) - 1)]
+
+
+@hg_profile.timed
+def get_default_spread_table():
+    """Return the process wide DefaultSpreadTable, reading the sheet once."""
+    global _default_spread_table
+    if _default_spread_table is None:
+        with _default_spread_lock:
+            if _default_spread_table is None:
+                _default_spread_table = DefaultSpreadTable.from_excel()
+    return _default_spread_table
+
+
+@hg_profile.timed
+def get_default_spread(intCover):
+    return get_default_spread_table().spread(intCover)
+
+
+def get_default_spreads(int_covers):
+    """Vectorized get_default_spread over an array of coverage ratios."""
+    return get_default_spread_table().spreads_for(int_covers)
+
+
+@hg_profile.timed
+def get_rAndD_years(industry):
+    rAndD_years = get_amortization_table().lookup(industry)
+    logger.debug("Years = %s", rAndD_years)
     return rAndD_years
@@ -0,0 +1,110 @@
+"""
+Shared logging setup for the valuation scripts.
+
+Modules only create log records; setup_logging() is called once by an entry
+point. Records from the package's loggers are put on an in-memory queue and
+written by a single background listener that owns the console and
+data/value.log handlers, so a worker thread never waits on the log file.
+Messages use %-style arguments, so a call below the configured level costs a
+level check and nothing is formatted. Worker processes log to a process safe
+queue (worker_log_queue) that a second listener forwards to the first.
+
+"""
+
+import atexit
+import copy
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+
+LOG_FILE = "data/value.log"
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Set FMP_LOG_LEVEL=DEBUG to log every intermediate value of the model.
+LOG_LEVEL = os.environ.get("FMP_LOG_LEVEL", "INFO")
+
+# Loggers whose records go through the queue
+LOGGERS = (
+    "fmp_backfill",
+    "fmp_fcff",
+    "fmp_pipeline",
+    "hg_async",
+    "hg_fmplib",
+    "hg_store",
+)
+
+_listener = None
+_handler = None
+_lock = threading.Lock()
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # Merge the arguments now in case they change later, but leave the
+        # timestamp and layout to the listener thread
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(level=None, path=LOG_FILE, console_level=logging.WARNING):
+    """Route the package's loggers through one queue to console and file.
+
+    Safe to call more than once; later calls only change the level. The
+    listener is stopped at exit, which flushes whatever is still queued.
+    """
+    global _listener, _handler
+    level = level or LOG_LEVEL
+    with _lock:
+        if _listener is None:
+            formatter = logging.Formatter(LOG_FORMAT)
+
+            stream_handler = logging.StreamHandler()
+            stream_handler.setLevel(console_level)
+            stream_handler.setFormatter(formatter)
+
+            file_handler = logging.FileHandler(path, delay=True)
+            file_handler.setLevel(logging.DEBUG)
+            file_handler.setFormatter(formatter)
+
+            log_queue = queue.SimpleQueue()
+            _handler = _QueueHandler(log_queue)
+            _listener = logging.handlers.QueueListener(
+                log_queue, stream_handler, file_handler, respect_handler_level=True
+            )
+            _listener.start()
+            atexit.register(_listener.stop)
+
+        for name in LOGGERS:
+            logger = logging.getLogger(name)
+            logger.setLevel(level)
+            if _handler not in logger.handlers:
+                logger.addHandler(_handler)
+
+
+def worker_log_queue(mp_context):
+    """Return (queue, listener) for worker processes of mp_context to log to.
+
+    The listener hands the workers' records to this process's handlers; pass
+    the queue to setup_worker_logging in each worker and stop the listener
+    once the workers have exited. (None, None) if setup_logging hasn't been
+    called, in which case workers keep the default logging.
+    """
+    if _handler is None:
+        return None, None
+    log_queue = mp_context.Queue()
+    listener = logging.handlers.QueueListener(log_queue, _handler)
+    listener.start()
+    return log_queue, listener
+
+
+def setup_worker_logging(log_queue, level):
+    """Route the package's loggers in a worker process to log_queue."""
+    handler = _QueueHandler(log_queue)
+    for name in LOGGERS:
+        logger = logging.getLogger(name)
+        logger.setLevel(level)
+        logger.handlers = [handler]
@@ -0,0 +1,255 @@
+"""
+Timing spans and run profile reports.
+
+Fetches and calc_* steps are wrapped in named spans (the timed decorator or
+the span context manager). While profiling is off, which is the default, a
+span is a shared no-op and a decorated function pays one flag check. When it
+is on (enable() or FMP_PROFILE=1) every span's wall time is recorded with the
+ticker it ran for and the bytes downloaded inside it, alongside counters such
+as response cache hits. report() aggregates them into count, total and
+p50/p95/p99 per span, overall and per ticker, for a JSON report or the
+run_profile table.
+
+"""
+
+from collections import defaultdict
+from contextlib import nullcontext
+from datetime import datetime
+import functools
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+PROFILE_SCHEMA = """CREATE TABLE IF NOT EXISTS run_profile (
+              run_id TEXT NOT NULL,
+              ticker TEXT NOT NULL,
+              span TEXT NOT NULL,
+              count INTEGER NOT NULL,
+              total_s REAL NOT NULL,
+              p50_s REAL,
+              p95_s REAL,
+              p99_s REAL,
+              max_s REAL,
+              bytes INTEGER NOT NULL,
+              PRIMARY KEY (run_id, ticker, span)
+              )
+              ;"""
+
+_NULL_SPAN = nullcontext()
+_local = threading.local()
+
+
+class Profiler:
+    """Collects span timings and counters from every thread of a run."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.run_id = datetime.now().isoformat(timespec="seconds")
+            self.started = time.perf_counter()
+            self.spans = []  # (name, ticker, seconds, bytes)
+            self.counters = defaultdict(int)
+            self.ticker_counters = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, seconds, ticker=None, nbytes=0):
+        with self._lock:
+            self.spans.append((name, ticker, seconds, nbytes))
+
+    def count(self, name, ticker=None, n=1):
+        with self._lock:
+            self.counters[name] += n
+            if ticker is not None:
+                self.ticker_counters[ticker][name] += n
+
+    def report(self):
+        """Aggregate the recorded spans into a JSON serializable dict."""
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+            ticker_counters = {t: dict(c) for t, c in self.ticker_counters.items()}
+
+        by_name = defaultdict(list)
+        by_ticker = defaultdict(lambda: defaultdict(list))
+        for name, ticker, seconds, nbytes in spans:
+            by_name[name].append((seconds, nbytes))
+            if ticker is not None:
+                by_ticker[ticker][name].append((seconds, nbytes))
+
+        tickers = {}
+        for ticker in sorted(set(by_ticker) | set(ticker_counters)):
+            tickers[ticker] = {
+                "spans": {
+                    name: _stats(samples, percentiles=False)
+                    for name, samples in sorted(by_ticker[ticker].items())
+                },
+                "counters": ticker_counters.get(ticker, {}),
+            }
+        return {
+            "run_id": self.run_id,
+            "elapsed_s": time.perf_counter() - self.started,
+            "spans": {
+                name: _stats(samples) for name, samples in sorted(by_name.items())
+            },
+            "counters": counters,
+            "tickers": tickers,
+        }
+
+    def write_json(self, path):
+        report = self.report()
+        with open(path, "w") as f:
+            json.dump(report, f, indent=1)
+        return report
+
+    def write_table(self, conn):
+        """Write the report to the run_profile table of an open connection.
+
+        Aggregate rows have an empty ticker; counters are stored as spans
+        named counter:<name> with only a count.
+        """
+        report = self.report()
+        rows = []
+        for ticker, spans, counters in [
+            ("", report["spans"], report["counters"]),
+            *(
+                (ticker, t["spans"], t["counters"])
+                for ticker, t in report["tickers"].items()
+            ),
+        ]:
+            for name, s in spans.items():
+                rows.append(
+                    (
+                        report["run_id"],
+                        ticker,
+                        name,
+                        s["count"],
+                        s["total_s"],
+                        s.get("p50_s"),
+                        s.get("p95_s"),
+                        s.get("p99_s"),
+                        s.get("max_s"),
+                        s["bytes"],
+                    )
+                )
+            for name, n in counters.items():
+                rows.append(
+                    (report["run_id"], ticker, f"counter:{name}", n, 0.0)
+                    + (None,) * 4
+                    + (0,)
+                )
+        with conn:
+            conn.execute(PROFILE_SCHEMA)
+            conn.executemany(
+                "INSERT OR REPLACE INTO run_profile VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+        return report
+
+
+def _stats(samples, percentiles=True):
+    seconds = np.array([s for s, _ in samples])
+    stats = {
+        "count": len(samples),
+        "total_s": float(seconds.sum()),
+        "bytes": int(sum(b for _, b in samples)),
+    }
+    if percentiles:
+        p50, p95, p99 = np.percentile(seconds, (50, 95, 99)).tolist()
+        stats.update(p50_s=p50, p95_s=p95, p99_s=p99, max_s=float(seconds.max()))
+    return stats
+
+
+PROFILER = Profiler(enabled=os.environ.get("FMP_PROFILE", "") not in ("", "0"))
+
+
+def enable(on=True):
+    PROFILER.enabled = on
+
+
+def _stack():
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+
+class _Span:
+    __slots__ = ("name", "ticker", "start", "nbytes")
+
+    def __init__(self, name, ticker):
+        self.name = name
+        self.ticker = ticker
+        self.nbytes = 0
+
+    def __enter__(self):
+        stack = _stack()
+        if self.ticker is None and stack:
+            self.ticker = stack[-1].ticker
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        stack = _stack()
+        stack.pop()
+        if stack:
+            stack[-1].nbytes += self.nbytes
+        PROFILER.record(self.name, elapsed, self.ticker, self.nbytes)
+
+
+def span(name, ticker=None):
+    """Context manager timing a block; the ticker defaults to the enclosing span's."""
+    if not PROFILER.enabled:
+        return _NULL_SPAN
+    return _Span(name, ticker)
+
+
+def timed(fn=None, *, name=None, ticker_arg=None):
+    """Decorator timing every call of a function as a span.
+
+    The span is named after the function unless name is given. ticker_arg is
+    the position of an argument holding the ticker the call is for.
+    """
+
+    def decorate(fn):
+        span_name = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return fn(*args, **kwargs)
+            ticker = None
+            if ticker_arg is not None and len(args) > ticker_arg:
+                ticker = args[ticker_arg]
+            with _Span(span_name, ticker):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate(fn) if fn is not None else decorate
+
+
+def add_bytes(nbytes):
+    """Count bytes downloaded against the innermost open span."""
+    if PROFILER.enabled:
+        stack = _stack()
+        if stack:
+            stack[-1].nbytes += nbytes
+        PROFILER.count("bytes", n=nbytes)
+
+
+def count(name, ticker=None, n=1):
+    """Bump a run counter, e.g. count("cache_hit", ticker)."""
+    if PROFILER.enabled:
+        if ticker is None:
+            stack = _stack()
+            ticker = stack[-1].ticker if stack else None
+        PROFILER.count(name, ticker, n)
@@ -0,0 +1,89 @@
+"""
+Columnar model for quarterly financial statements.
+
+A Statement keeps the quarters of one FMP statement as a single
+quarters x fields float array plus a field -> column index, most recent
+quarter first, the same order the API returns them. Annual totals and
+year-end balances are one reshape away, for any number of quarters.
+
+"""
+
+import numpy as np
+
+
+class Statement:
+    """Quarters x fields array of one statement, most recent quarter first."""
+
+    __slots__ = ("values", "fields", "index", "dates", "filing_dates")
+
+    def __init__(self, values, fields, dates=(), filing_dates=()):
+        self.values = np.asarray(values, dtype=float).reshape(-1, len(fields))
+        self.fields = tuple(fields)
+        self.index = {field: i for i, field in enumerate(self.fields)}
+        self.dates = tuple(dates)
+        self.filing_dates = tuple(filing_dates)
+
+    @classmethod
+    def from_records(cls, records, fields):
+        """Build a Statement from FMP JSON records, keeping only `fields`.
+
+        Missing or non-numeric values become 0.0 (hg_fmplib.safe_float).
+        """
+        # Imported here rather than at the top because hg_fmplib imports
+        # this module
+        from hg_fmplib import safe_float
+
+        records = records or []
+        values = np.array(
+            [[safe_float(record.get(field)) for field in fields] for record in records],
+            dtype=float,
+        )
+        return cls(
+            values,
+            fields,
+            [record.get("date", "") for record in records],
+            [record.get("filingDate") or record.get("date", "") for record in records],
+        )
+
+    def __len__(self):
+        return self.values.shape[0]
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def column(self, field):
+        return self.values[:, self.index[field]]
+
+    def _columns(self, fields):
+        if fields is None:
+            return slice(None)
+        return [self.index[field] for field in fields]
+
+    def annual_sums(self, fields=None, years=None):
+        """Sum complete blocks of four quarters: a years x fields array.
+
+        An incomplete year at the end of the history is dropped.
+        """
+        full_years = len(self) // 4
+        if years is not None:
+            full_years = min(full_years, years)
+        block = self.values[: full_years * 4, self._columns(fields)]
+        return block.reshape(full_years, 4, -1).sum(axis=1)
+
+    def year_end(self, fields=None, years=None):
+        """Balances at each fiscal year end (every fourth quarter from the latest)."""
+        snapshots = self.values[::4, self._columns(fields)]
+        if years is not None:
+            snapshots = snapshots[:years]
+        return snapshots
+
+    def as_of(self, as_of_date):
+        """The quarters that had been filed on as_of_date (an ISO date string)."""
+        mask = np.array([filed <= as_of_date for filed in self.filing_dates], bool)
+        return Statement(
+            self.values[mask],
+            self.fields,
+            [d for d, keep in zip(self.dates, mask) if keep],
+            [d for d, keep in zip(self.filing_dates, mask) if keep],
+        )
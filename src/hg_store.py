@@ -0,0 +1,390 @@
+"""
+SQLite storage for valuation results.
+
+ValuationStore keeps one long-lived connection in WAL mode, creates the
+schema once, and buffers rows so a batch of valuations is written in a few
+executemany transactions instead of one commit per row.
+
+latest_valuation mirrors the newest row per ticker (maintained by
+triggers) and, with the secondary indexes, serves screen() queries.
+
+Each row carries input_hash, a fingerprint of the statements and market
+inputs it was computed from, so a later run can tell whether anything but
+the price has changed since. implied_growth_rate is the growth rate at which
+the model's share value equals the price (NaN/NULL when none does).
+
+"""
+
+from pathlib import Path
+import re
+import sqlite3
+
+import hg_profile
+import logging
+
+logger = logging.getLogger(__name__)
+
+VALUATION_DB = "/Volumes/Financial_Data/valuation.db"
+DEFAULT_BATCH_SIZE = 500
+
+# Column order matches the fields of fmp_fcff.Stock_Value.
+VALUATION_COLUMNS = (
+    "ticker",
+    "valuation_date",
+    "ent_name",
+    "industry",
+    "beta",
+    "market_cap",
+    "price",
+    "shares_outstanding",
+    "risk_free_rate",
+    "eq_premium",
+    "growth_rate",
+    "cost_of_capital",
+    "wealth_pc",
+    "fcff_value",
+    "terminal_value",
+    "share_value",
+    "margin_of_safety",
+    "margin_of_safety_pc",
+    "input_hash",
+    "implied_growth_rate",
+)
+
+VALUATION_SCHEMA = """CREATE TABLE IF NOT EXISTS valuation (
+              ticker TEXT NOT NULL,
+              valuation_date TEXT NOT NULL,
+              ent_name TEXT NOT NULL,
+              industry TEXT NOT NULL,
+              beta REAL NOT NULL,
+              market_cap REAL NOT NULL,
+              price REAL NOT NULL,
+              shares_outstanding REAL NOT NULL,
+              risk_free_rate REAL NOT NULL,
+              eq_premium REAL NOT NULL,
+              growth_rate REAL NOT NULL,
+              cost_of_capital REAL NOT NULL,
+              wealth_pc REAL NO NULL,
+              fcff_value REAL NOT NULL,
+              terminal_value REAL NOT NULL,
+              share_value REAL NOT NULL,
+              margin_of_safety REAL NOT NULL,
+              margin_of_safety_pc REAL NOT NULL,
+              input_hash TEXT,
+              implied_growth_rate REAL,
+              PRIMARY KEY (ticker, valuation_date)
+              )
+              ;"""
+
+# Latest row per ticker, kept current by the triggers below so screens of
+# the latest run never scan the history.
+LATEST_SCHEMA = VALUATION_SCHEMA.replace(
+    "TABLE IF NOT EXISTS valuation (", "TABLE IF NOT EXISTS latest_valuation ("
+).replace("PRIMARY KEY (ticker, valuation_date)", "PRIMARY KEY (ticker)")
+
+_COLUMNS = ", ".join(VALUATION_COLUMNS)
+
+LATEST_TRIGGERS = (
+    f"""CREATE TRIGGER IF NOT EXISTS valuation_latest_insert
+              AFTER INSERT ON valuation
+              WHEN NOT EXISTS (
+                  SELECT 1 FROM latest_valuation
+                  WHERE ticker = NEW.ticker
+                  AND valuation_date > NEW.valuation_date)
+              BEGIN
+                  INSERT OR REPLACE INTO latest_valuation ({_COLUMNS})
+                  VALUES ({", ".join("NEW." + c for c in VALUATION_COLUMNS)});
+              END""",
+    f"""CREATE TRIGGER IF NOT EXISTS valuation_latest_delete
+              AFTER DELETE ON valuation
+              BEGIN
+                  DELETE FROM latest_valuation
+                  WHERE ticker = OLD.ticker
+                  AND valuation_date = OLD.valuation_date;
+                  INSERT OR IGNORE INTO latest_valuation ({_COLUMNS})
+                  SELECT {_COLUMNS} FROM valuation WHERE ticker = OLD.ticker
+                  ORDER BY valuation_date DESC LIMIT 1;
+              END""",
+)
+
+VALUATION_INDEXES = (
+    (
+        "CREATE INDEX IF NOT EXISTS valuation_date_idx "
+        "ON valuation (valuation_date, margin_of_safety_pc)"
+    ),
+    (
+        "CREATE INDEX IF NOT EXISTS valuation_industry_idx "
+        "ON valuation (industry, valuation_date)"
+    ),
+    (
+        "CREATE INDEX IF NOT EXISTS latest_margin_idx "
+        "ON latest_valuation (margin_of_safety_pc)"
+    ),
+    (
+        "CREATE INDEX IF NOT EXISTS latest_industry_idx "
+        "ON latest_valuation (industry, margin_of_safety_pc)"
+    ),
+)
+
+# (ticker, valuation_date) pairs the backfill couldn't value, e.g. before the
+# ticker had enough filed quarters, so later runs don't retry them
+BACKFILL_SKIPPED_SCHEMA = """CREATE TABLE IF NOT EXISTS backfill_skipped (
+              ticker TEXT NOT NULL,
+              valuation_date TEXT NOT NULL,
+              reason TEXT NOT NULL,
+              PRIMARY KEY (ticker, valuation_date)
+              )
+              ;"""
+
+# Columns added after the first release, created on older databases by
+# create_schema
+ADDED_COLUMNS = {"input_hash": "TEXT", "implied_growth_rate": "REAL"}
+
+INSERT_VALUATION = (
+    f"INSERT OR REPLACE INTO valuation ({', '.join(VALUATION_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in VALUATION_COLUMNS)})"
+)
+
+
+def valuation_row(val):
+    """Return a Stock_Value as a tuple in VALUATION_COLUMNS order."""
+    return tuple(getattr(val, column) for column in VALUATION_COLUMNS)
+
+
+def add_missing_columns(conn, table):
+    """ALTER an older table to add any of ADDED_COLUMNS; returns those added."""
+    columns = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+    missing = [c for c in ADDED_COLUMNS if c not in columns]
+    for column in missing:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {ADDED_COLUMNS[column]}")
+    return missing
+
+
+def create_schema(conn):
+    conn.execute(VALUATION_SCHEMA)
+    add_missing_columns(conn, "valuation")
+
+    new_latest = not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'latest_valuation'"
+    ).fetchone()
+    conn.execute(LATEST_SCHEMA)
+    if add_missing_columns(conn, "latest_valuation"):
+        # The triggers copy a fixed column list; recreate them below
+        conn.execute("DROP TRIGGER IF EXISTS valuation_latest_insert")
+        conn.execute("DROP TRIGGER IF EXISTS valuation_latest_delete")
+    if new_latest:
+        # Seed from the existing history once; the triggers keep it current
+        conn.execute(
+            f"INSERT INTO latest_valuation ({_COLUMNS}) "
+            f"SELECT {', '.join('v.' + c for c in VALUATION_COLUMNS)} "
+            "FROM valuation v JOIN ("
+            "SELECT ticker, MAX(valuation_date) AS valuation_date "
+            "FROM valuation GROUP BY ticker"
+            ") m ON v.ticker = m.ticker AND v.valuation_date = m.valuation_date"
+        )
+    for statement in LATEST_TRIGGERS + VALUATION_INDEXES:
+        conn.execute(statement)
+    conn.execute(BACKFILL_SKIPPED_SCHEMA)
+    conn.commit()
+
+
+def _chunks(seq, n=500):
+    """seq in lists of at most n, to stay under sqlite's bound parameter limit."""
+    seq = list(seq)
+    for i in range(0, len(seq), n):
+        yield seq[i : i + n]
+
+
+def existing_keys(conn, tickers=None, table="valuation"):
+    """The (ticker, valuation_date) pairs already in the table."""
+    if tickers is None:
+        rows = conn.execute(f"SELECT ticker, valuation_date FROM {table}")
+    else:
+        rows = []
+        for chunk in _chunks(tickers):
+            rows.extend(
+                conn.execute(
+                    f"SELECT ticker, valuation_date FROM {table} "
+                    f"WHERE ticker IN ({', '.join('?' for _ in chunk)})",
+                    chunk,
+                )
+            )
+    return set(rows)
+
+
+def record_skipped(conn, rows):
+    """Record (ticker, valuation_date, reason) rows the backfill skipped."""
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO backfill_skipped "
+            "(ticker, valuation_date, reason) VALUES (?, ?, ?)",
+            rows,
+        )
+
+
+def clear_skipped(conn, tickers):
+    """Forget the skipped dates of tickers, so the backfill tries them again."""
+    with conn:
+        for chunk in _chunks(tickers):
+            conn.execute(
+                "DELETE FROM backfill_skipped "
+                f"WHERE ticker IN ({', '.join('?' for _ in chunk)})",
+                chunk,
+            )
+
+
+def latest_valuations(conn, tickers):
+    """The most recent row for each ticker, as {ticker: row} in column order."""
+    latest = {}
+    for chunk in _chunks(tickers):
+        rows = conn.execute(
+            f"SELECT {_COLUMNS} FROM latest_valuation "
+            f"WHERE ticker IN ({', '.join('?' for _ in chunk)})",
+            chunk,
+        )
+        latest.update((row[0], row) for row in rows)
+    return latest
+
+
+# ## Screening
+
+
+def connect_read_only(database):
+    """Open database read only, for screens that must not migrate or lock it.
+
+    The schema is created and migrated by the writers (ValuationStore,
+    create_schema); a missing file raises sqlite3.OperationalError.
+    """
+    uri = f"{Path(database).absolute().as_uri()}?mode=ro"
+    return sqlite3.connect(uri, uri=True)
+
+
+SCREEN_OPERATORS = ("<=", ">=", "!=", "=", "<", ">")
+# column, operator, value; a value may not start with an operator character,
+# so e.g. "wealth_pc => 0" is rejected rather than read as = "> 0"
+FILTER_PATTERN = re.compile(
+    rf"^\s*(\w+)\s*({'|'.join(SCREEN_OPERATORS)})\s*([^<>=!\s].*?)\s*$"
+)
+
+
+def parse_filter(text):
+    """Parse "column op value" (e.g. "wealth_pc>0") into a filter tuple."""
+    match = FILTER_PATTERN.match(text)
+    if match is None:
+        raise ValueError(f"Not a filter: {text!r}")
+    column, op, value = match.groups()
+    try:
+        value = float(value)
+    except ValueError:
+        pass
+    return column, op, value
+
+
+def screen(
+    conn,
+    filters=(),
+    industry=None,
+    order_by="margin_of_safety_pc",
+    descending=True,
+    limit=50,
+    per_industry=None,
+    valuation_date=None,
+):
+    """Rank valuations, returning a list of dicts in VALUATION_COLUMNS order.
+
+    Screens the latest valuation of every ticker, or the rows of one
+    valuation_date. filters are (column, operator, value) tuples, all of
+    which must hold. With per_industry the top per_industry rows of each
+    industry are returned (limit then caps the total).
+    """
+    for column in [order_by, *(f[0] for f in filters)]:
+        if column not in VALUATION_COLUMNS:
+            raise ValueError(f"Unknown column {column!r}")
+
+    where, params = [], []
+    if valuation_date is None:
+        table = "latest_valuation"
+    else:
+        table = "valuation"
+        where.append("valuation_date = ?")
+        params.append(valuation_date)
+    if industry is not None:
+        where.append("industry = ?")
+        params.append(industry)
+    for column, op, value in filters:
+        if op not in SCREEN_OPERATORS:
+            raise ValueError(f"Unknown operator {op!r}")
+        where.append(f"{column} {op} ?")
+        params.append(value)
+
+    direction = "DESC" if descending else "ASC"
+    query = f"SELECT {_COLUMNS} FROM {table}"
+    if where:
+        query += " WHERE " + " AND ".join(where)
+    if per_industry is not None:
+        query = (
+            f"SELECT {_COLUMNS} FROM ("
+            f"SELECT *, ROW_NUMBER() OVER (PARTITION BY industry "
+            f"ORDER BY {order_by} {direction}) AS industry_rank FROM ({query})"
+            ") WHERE industry_rank <= ?"
+        )
+        params.append(per_industry)
+        query += f" ORDER BY industry, {order_by} {direction}"
+    else:
+        query += f" ORDER BY {order_by} {direction}"
+    if limit is not None:
+        query += " LIMIT ?"
+        params.append(limit)
+
+    return [dict(zip(VALUATION_COLUMNS, row)) for row in conn.execute(query, params)]
+
+
+class ValuationStore:
+    """Buffered writer for the valuation table.
+
+    Rows passed to add() are held until batch_size of them are waiting and
+    then written with one executemany in a single transaction. flush() writes
+    whatever is pending; close() (or leaving a `with` block) flushes and
+    closes the connection. A store belongs to the thread that created it.
+    """
+
+    def __init__(self, database=VALUATION_DB, batch_size=DEFAULT_BATCH_SIZE):
+        self.database = database
+        self.batch_size = batch_size
+        self.conn = sqlite3.connect(database)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        create_schema(self.conn)
+        self._pending = []
+        self.written = 0
+
+    def add(self, val):
+        self._pending.append(valuation_row(val))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def add_many(self, vals):
+        for val in vals:
+            self.add(val)
+
+    @hg_profile.timed(name="store_flush")
+    def flush(self):
+        if not self._pending:
+            return
+        with self.conn:
+            self.conn.executemany(INSERT_VALUATION, self._pending)
+        self.written += len(self._pending)
+        logger.info("Wrote %s valuations to %s", len(self._pending), self.database)
+        self._pending = []
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
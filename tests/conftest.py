@@ -0,0 +1,14 @@
+"""
+Put src/ and bench/ on the import path and read the reference spreadsheets
+from the repository's data/ directory.
+
+"""
+
+from pathlib import Path
+import os
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "bench"))
+os.environ.setdefault("FMP_DATA_DIR", str(ROOT / "data"))
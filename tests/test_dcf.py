@@ -0,0 +1,189 @@
+"""
+The vectorized hg_dcf kernels against the scalar calc_* chain in fmp_fcff,
+and the reverse DCF solved back to the inputs it came from.
+
+    python -m pytest tests
+
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+import fmp_fcff
+import hg_dcf
+
+RISK_FREE = 0.04
+# adjusted_ebiat, growth, reinvestment, discount, stable cost, period, cash,
+# debt, shares
+CASES = [
+    (1_000.0, 0.08, 0.40, 0.09, 0.07, 5, 200.0, 300.0, 50.0),
+    (2_500.0, -0.03, 0.10, 0.11, 0.08, 10, 0.0, 1_000.0, 120.0),
+    (750.0, 0.09, 0.60, 0.09, 0.065, 3, 50.0, 0.0, 10.0),  # g == r
+    (-400.0, 0.15, -0.20, 0.12, 0.09, 7, 900.0, 100.0, 30.0),
+]
+
+
+def scalar_value(
+    adjusted_ebiat,
+    growth_rate,
+    reinvestment_rate,
+    discount_rate,
+    stable_cost,
+    growth_period,
+    cash,
+    bv_debt,
+    shares,
+):
+    """fcff, terminal and intrinsic value from the fmp_fcff calc_* functions."""
+    ctx = fmp_fcff.ValuationContext(0.05, RISK_FREE)
+    fcff_table = fmp_fcff.calc_expected_fcff(
+        adjusted_ebiat, growth_rate, reinvestment_rate, growth_period
+    )
+    fcff_value = fmp_fcff.calc_fcff_value(fcff_table, discount_rate)
+    terminal_value = fmp_fcff.calc_terminal_value(
+        fcff_table[-1], stable_cost, discount_rate, growth_period, ctx
+    )
+    intrinsic_value = fmp_fcff.calc_intrinsic_value(
+        fcff_value, terminal_value, cash, bv_debt, shares
+    )
+    return fcff_value, terminal_value, intrinsic_value
+
+
+def kernel(cases, **overrides):
+    columns = [np.array(c, dtype=float) for c in zip(*cases)]
+    ebiat, g, reinvestment, r, stable, n, cash, debt, shares = columns
+    inputs = dict(
+        adjusted_ebiat=ebiat,
+        growth_rate=g,
+        reinvestment_rate=reinvestment,
+        discount_rate=r,
+        stable_cost_of_capital=stable,
+        growth_period=n,
+        risk_free=RISK_FREE,
+        cash_and_equivalents=cash,
+        bv_debt=debt,
+        shares_outstanding=shares,
+    )
+    return {**inputs, **overrides}
+
+
+@pytest.mark.parametrize(
+    "g, r, n", [(0.08, 0.09, 5), (-0.03, 0.11, 10), (0.09, 0.09, 3), (0.2, 0.1, 1)]
+)
+def test_growth_pv_factor_matches_the_series(g, r, n):
+    series = sum(((1 + g) / (1 + r)) ** t for t in range(1, n + 1))
+    assert hg_dcf.growth_pv_factor(g, r, n) == pytest.approx(series, rel=1e-12)
+
+
+def test_dcf_kernel_matches_the_scalar_chain():
+    result = hg_dcf.dcf_kernel(**kernel(CASES))
+    for i, case in enumerate(CASES):
+        fcff_value, terminal_value, intrinsic_value = scalar_value(*case)
+        assert result.fcff_value[i] == pytest.approx(fcff_value, rel=1e-12)
+        assert result.terminal_value[i] == pytest.approx(terminal_value, rel=1e-12)
+        assert result.intrinsic_value[i] == pytest.approx(intrinsic_value, rel=1e-12)
+
+
+def test_stable_beta_kernel_matches_calc_stable_beta():
+    betas = [0.2, 0.5, 0.9, 1.5, 1.51, 2.4]
+    assert hg_dcf.stable_beta_kernel(betas).tolist() == [
+        fmp_fcff.calc_stable_beta(b) for b in betas
+    ]
+
+
+@pytest.mark.parametrize(
+    "solve_for", ["growth_rate", "reinvestment_rate", "discount_rate"]
+)
+def test_implied_rate_recovers_the_input(solve_for):
+    inputs = kernel(CASES[:2])
+    price = hg_dcf.dcf_kernel(**inputs).intrinsic_value
+    expected = inputs.pop(solve_for)
+    solved = hg_dcf.implied_rate(price, inputs, solve_for)
+    np.testing.assert_allclose(solved, expected, atol=1e-8)
+
+
+def test_implied_rate_is_nan_outside_the_bounds():
+    inputs = kernel(CASES[:1])
+    price = hg_dcf.dcf_kernel(**inputs).intrinsic_value
+    del inputs["growth_rate"]
+    solved = hg_dcf.implied_rate([price[0], price[0] * 1e6], inputs)
+    assert np.isfinite(solved[0])
+    assert np.isnan(solved[1])
+
+
+def test_implied_growth_inputs_reproduce_the_share_value():
+    growth_period = 5
+    cases = [c[:5] + (growth_period,) + c[6:] for c in CASES]
+    result = hg_dcf.dcf_kernel(**kernel(cases))
+    valuations = [
+        fmp_fcff.Stock_Value(
+            ticker=f"T{i}",
+            valuation_date="2026-09-30",
+            ent_name=f"T{i} Inc",
+            industry="Software",
+            beta=1.0,
+            market_cap=0.0,
+            price=float(result.intrinsic_value[i]) * 0.8,
+            shares_outstanding=c[8],
+            risk_free_rate=RISK_FREE,
+            eq_premium=0.05,
+            growth_rate=c[1],
+            cost_of_capital=c[3],
+            wealth_pc=0.0,
+            fcff_value=float(result.fcff_value[i]),
+            terminal_value=float(result.terminal_value[i]),
+            share_value=float(result.intrinsic_value[i]),
+            margin_of_safety=0.0,
+            margin_of_safety_pc=0.0,
+        )
+        for i, c in enumerate(cases)
+    ]
+    inputs = fmp_fcff.implied_growth_inputs(valuations, growth_period)
+    growth = np.array([v.growth_rate for v in valuations])
+    np.testing.assert_allclose(
+        hg_dcf.dcf_kernel(**inputs, growth_rate=growth).intrinsic_value,
+        result.intrinsic_value,
+        rtol=1e-10,
+    )
+    for v, solved in zip(
+        valuations, fmp_fcff.with_implied_growth(valuations, growth_period)
+    ):
+        again = hg_dcf.dcf_kernel(
+            **fmp_fcff.implied_growth_inputs([v], growth_period),
+            growth_rate=solved.implied_growth_rate,
+        ).intrinsic_value[0]
+        assert again == pytest.approx(v.price, rel=1e-7)
+
+
+def test_sensitivity_grid_matches_the_kernel_cell_by_cell():
+    ebiat, reinvestment = np.array([1_000.0, 2_500.0]), np.array([0.4, 0.1])
+    cash, debt, shares = np.array([200.0, 0.0]), np.array([300.0, 1_000.0]), 50.0
+    periods, rates = [3, 5, 10], [0.08, 0.10]
+    growths, stables = [-0.02, 0.05, 0.10], [0.03, 0.06, 0.08]
+
+    grid = hg_dcf.sensitivity_grid(
+        ebiat,
+        reinvestment,
+        periods,
+        rates,
+        growths,
+        stables,
+        RISK_FREE,
+        cash,
+        debt,
+        shares,
+    )
+    assert grid.intrinsic_value.shape == (2, 3, 2, 3, 3)
+    for (i, n), (j, r), (k, g), (m, s) in itertools.product(
+        *(enumerate(axis) for axis in (periods, rates, growths, stables))
+    ):
+        cell = grid.intrinsic_value[:, i, j, k, m]
+        if s <= RISK_FREE:
+            assert np.isnan(cell).all()
+            continue
+        expected = hg_dcf.dcf_kernel(
+            ebiat, g, reinvestment, r, s, n, RISK_FREE, cash, debt, shares
+        ).intrinsic_value
+        np.testing.assert_allclose(cell, expected, rtol=1e-12)
@@ -0,0 +1,79 @@
+"""
+fetch_fmp_batch and get_quotes against the stand-in server in bench/.
+
+    python -m pytest tests
+
+"""
+
+import pytest
+
+import hg_cache
+import hg_fmplib
+import stub_server
+
+SYMBOLS = ["AAPL", "F", "MSFT"]
+
+
+def serve(monkeypatch, **options):
+    server = stub_server.serve_in_thread(**options)
+    monkeypatch.setattr(hg_fmplib, "FMP_BASE_URL", f"{server.url}/stable")
+    return server
+
+
+def requests_made(server):
+    return server.stats_snapshot()["requests"]
+
+
+@pytest.fixture(autouse=True)
+def cache(tmp_path, monkeypatch):
+    cache = hg_cache.ResponseCache(str(tmp_path / "cache.db"))
+    monkeypatch.setattr(hg_cache, "CACHE", cache)
+    yield cache
+    cache.close()
+
+
+@pytest.fixture
+def server(monkeypatch):
+    server = serve(monkeypatch)
+    yield server
+    server.shutdown()
+
+
+def test_batch_is_split_by_symbol(server):
+    rows = hg_fmplib.fetch_fmp_batch("batch-quote", SYMBOLS, "test", chunk_size=2)
+    assert list(rows) == SYMBOLS
+    for symbol in SYMBOLS:
+        assert [row["symbol"] for row in rows[symbol]] == [symbol]
+    assert requests_made(server) == 2
+
+
+def test_batch_is_cached_per_symbol(server, cache):
+    hg_fmplib.fetch_fmp_batch("batch-quote", SYMBOLS[:2], "test")
+    assert cache.get("batch-quote", "AAPL")[0]["symbol"] == "AAPL"
+
+    rows = hg_fmplib.fetch_fmp_batch("batch-quote", SYMBOLS, "test")
+    assert requests_made(server) == 2  # the second call only asked for MSFT
+    assert rows["MSFT"][0]["symbol"] == "MSFT"
+    assert cache.get("batch-quote", "MSFT") is not None
+
+
+def test_quotes_fall_back_for_symbols_missing_from_batch(monkeypatch):
+    server = serve(monkeypatch, missing={"F"})
+    try:
+        quotes = hg_fmplib.get_quotes(SYMBOLS, "test")
+        assert sorted(quotes) == sorted(SYMBOLS)
+        assert quotes["F"] == hg_fmplib.get_quote("F", "test")
+        assert hg_cache.CACHE.get("batch-quote", "F") is None
+    finally:
+        server.shutdown()
+
+
+def test_quotes_fall_back_when_batch_is_unavailable(monkeypatch):
+    server = serve(monkeypatch, unavailable={"batch-quote"})
+    try:
+        quotes = hg_fmplib.get_quotes(SYMBOLS, "test")
+        assert quotes == {s: hg_fmplib.get_quote(s, "test") for s in SYMBOLS}
+        # One refused batch request, then profile and shares-float per symbol
+        assert requests_made(server) == 1 + 2 * len(SYMBOLS)
+    finally:
+        server.shutdown()